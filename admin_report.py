@@ -0,0 +1,247 @@
+"""Platform-wide usage report.
+
+Splits users into user_id ranges and gives each range to a worker
+process. A worker scans food_logs (and optionally food_log_archive) for
+its users only, so it sees every user-day in full. It returns only small
+fixed-size aggregates: per-food log counts, daily active user counts,
+per-goal macro histograms and retention counters. Neither the workers
+nor the parent hold more than one range's user-days at a time. Every
+range is a short read-only query; nothing is locked beyond a normal
+SELECT.
+
+    python admin_report.py --workers 4 --chunk-size 2000 [--include-archive] [--json]
+"""
+import argparse
+import json
+import multiprocessing
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+import numpy as np
+from sqlalchemy import create_engine, func, select
+from model import FoodLog, FoodLogArchive, User
+
+RETENTION_DAYS = (1, 7, 14, 30, 60, 90)
+PERCENTILES = (10, 25, 50, 75, 90)
+MACROS = ('calories', 'protein', 'carbs', 'fat')
+# Histogram bin edges per macro for user-day totals; percentiles are read
+# back from the merged histograms, so they are exact to within one bin
+MACRO_BINS = {
+    'calories': np.arange(0, 10001, 10, dtype=np.float64),
+    'protein': np.arange(0, 1001, 1, dtype=np.float64),
+    'carbs': np.arange(0, 1501, 1, dtype=np.float64),
+    'fat': np.arange(0, 1001, 1, dtype=np.float64),
+}
+STREAM_BATCH_ROWS = 10000  # rows fetched per round trip from a server-side cursor
+
+_engine = None
+
+
+def _init_worker(database_uri):
+    global _engine
+    _engine = create_engine(database_uri)
+
+
+def _histograms(values):
+    """Per-macro bin counts for an (n, 4) array of user-day totals"""
+    hists = {}
+    for i, macro in enumerate(MACROS):
+        edges = MACRO_BINS[macro]
+        clipped = np.clip(values[:, i], edges[0], edges[-1])
+        hists[macro] = np.histogram(clipped, bins=edges)[0]
+    return hists
+
+
+def _aggregate_users(lo, hi, table_names, today, days):
+    """Aggregates for users with lo <= user_id < hi, which this worker owns completely"""
+    tables = [{'food_logs': FoodLog.__table__, 'food_log_archive': FoodLogArchive.__table__}[t]
+              for t in table_names]
+    users = User.__table__
+
+    food_counts = Counter()
+    user_days = {}
+    rows = 0
+    with _engine.connect() as conn:
+        # Server-side cursor, so a range's log rows never sit in memory all at once
+        conn = conn.execution_options(stream_results=True, yield_per=STREAM_BATCH_ROWS)
+        goals = dict(conn.execute(select(users.c.id, users.c.goal).where(
+            users.c.id >= lo, users.c.id < hi)).all())
+        for table in tables:
+            query = select(table.c.user_id, table.c.food_id, table.c.logged_at,
+                           table.c.calories, table.c.protein, table.c.carbs, table.c.fat).where(
+                table.c.user_id >= lo, table.c.user_id < hi)
+            for user_id, food_id, logged_at, cal, p, c, f in conn.execute(query):
+                rows += 1
+                food_counts[food_id] += 1
+                totals = user_days.setdefault((user_id, logged_at.date().toordinal()), [0.0, 0.0, 0.0, 0.0])
+                totals[0] += cal or 0
+                totals[1] += p or 0
+                totals[2] += c or 0
+                totals[3] += f or 0
+
+    # Daily active loggers over the last `days` days
+    dau = Counter(day for _, day in user_days if day > today - days)
+
+    # User-day macro histograms, by goal
+    by_goal = {}
+    for (user_id, _), totals in user_days.items():
+        by_goal.setdefault(goals.get(user_id) or 'unset', []).append(totals)
+    macro_hists = {goal: (len(values), _histograms(np.array(values))) for goal, values in by_goal.items()}
+
+    # Retention: users old enough for day N, and those who logged again exactly N days after their first day
+    first_day = {}
+    for user_id, day in user_days:
+        if day < first_day.get(user_id, today + 1):
+            first_day[user_id] = day
+    retention = {}
+    for n in RETENTION_DAYS:
+        eligible = [u for u, d in first_day.items() if d + n <= today]
+        kept = sum(1 for u in eligible if (u, first_day[u] + n) in user_days)
+        retention[n] = (len(eligible), kept)
+
+    return {
+        'rows': rows,
+        'users': len(first_day),
+        'food_counts': food_counts,
+        'dau': dau,
+        'macro_hists': macro_hists,
+        'retention': retention
+    }
+
+
+def _merge(into, partial):
+    into['rows'] += partial['rows']
+    into['users'] += partial['users']
+    into['food_counts'].update(partial['food_counts'])
+    into['dau'].update(partial['dau'])
+    for goal, (count, hists) in partial['macro_hists'].items():
+        existing = into['macro_hists'].get(goal)
+        if existing is None:
+            into['macro_hists'][goal] = (count, hists)
+        else:
+            into['macro_hists'][goal] = (existing[0] + count,
+                                         {m: existing[1][m] + hists[m] for m in MACROS})
+    for n, (eligible, kept) in partial['retention'].items():
+        prev = into['retention'].get(n, (0, 0))
+        into['retention'][n] = (prev[0] + eligible, prev[1] + kept)
+
+
+def _user_ranges(session, chunk_size):
+    lo, hi = session.query(func.min(User.id), func.max(User.id)).one()
+    if lo is None:
+        return []
+    return [(start, min(start + chunk_size, hi + 1)) for start in range(lo, hi + 1, chunk_size)]
+
+
+def _hist_percentiles(counts, edges, percentiles):
+    """Percentiles of a histogram, interpolating linearly within the bin"""
+    cum = np.cumsum(counts)
+    total = cum[-1]
+    result = []
+    for p in percentiles:
+        target = p / 100.0 * total
+        b = int(np.searchsorted(cum, target))
+        b = min(b, len(counts) - 1)
+        before = cum[b - 1] if b > 0 else 0
+        frac = (target - before) / counts[b] if counts[b] else 0.0
+        result.append(float(edges[b] + frac * (edges[b + 1] - edges[b])))
+    return result
+
+
+def build_report(food_names, merged, days):
+    """Turn merged partials into the final report dict"""
+    today = date.today().toordinal()
+
+    dau = [{'date': date.fromordinal(d).isoformat(), 'users': merged['dau'].get(d, 0)}
+           for d in range(today - days + 1, today + 1)]
+
+    distributions = {}
+    for goal, (count, hists) in merged['macro_hists'].items():
+        distributions[goal] = {
+            'user_days': count,
+            **{macro: dict(zip((f'p{p}' for p in PERCENTILES),
+                               np.round(_hist_percentiles(hists[macro], MACRO_BINS[macro], PERCENTILES), 1).tolist()))
+               for macro in MACROS}
+        }
+
+    retention = {f'day_{n}': round(kept / eligible, 3)
+                 for n, (eligible, kept) in sorted(merged['retention'].items()) if eligible}
+
+    top_foods = [{'food_id': fid, 'name': food_names.get(fid, '?'), 'logs': n}
+                 for fid, n in merged['food_counts'].most_common(20)]
+
+    return {
+        'log_rows': merged['rows'],
+        'users_with_logs': merged['users'],
+        'daily_active_loggers': dau,
+        'macro_distributions_by_goal': distributions,
+        'most_logged_foods': top_foods,
+        'retention': retention
+    }
+
+
+def print_report(report, elapsed):
+    print(f"📊 NutriTrack platform report ({report['log_rows']} log rows, "
+          f"{report['users_with_logs']} users, {elapsed:.1f}s)")
+
+    print("\nDaily active loggers:")
+    for entry in report['daily_active_loggers']:
+        print(f"  {entry['date']}: {entry['users']}")
+
+    print("\nDaily intake per user-day, by goal (p10 / p25 / p50 / p75 / p90):")
+    for goal, dist in report['macro_distributions_by_goal'].items():
+        print(f"  {goal} ({dist['user_days']} user-days)")
+        for macro in MACROS:
+            print(f"    {macro:<9} " + " / ".join(str(v) for v in dist[macro].values()))
+
+    print("\nMost-logged foods:")
+    for entry in report['most_logged_foods']:
+        print(f"  {entry['logs']:>7}  {entry['name']}")
+
+    print("\nRetention (logged again N days after first log):")
+    for key, value in report['retention'].items():
+        print(f"  {key}: {value:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Platform-wide usage report')
+    parser.add_argument('--workers', type=int, default=max(1, multiprocessing.cpu_count() - 1))
+    parser.add_argument('--chunk-size', type=int, default=2000, help='Users per worker task')
+    parser.add_argument('--days', type=int, default=30, help='Window for daily active loggers')
+    parser.add_argument('--include-archive', action='store_true', help='Also scan food_log_archive')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    from app import app
+    from model import db, Food
+
+    started = time.perf_counter()
+    today = date.today().toordinal()
+    with app.app_context():
+        database_uri = app.config['SQLALCHEMY_DATABASE_URI']
+        table_names = ('food_logs',) + (('food_log_archive',) if args.include_archive else ())
+        jobs = [(lo, hi, table_names, today, args.days) for lo, hi in _user_ranges(db.session, args.chunk_size)]
+        db.session.remove()
+
+    merged = {'rows': 0, 'users': 0, 'food_counts': Counter(), 'dau': Counter(), 'macro_hists': {}, 'retention': {}}
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(database_uri,)) as pool:
+        futures = [pool.submit(_aggregate_users, *job) for job in jobs]
+        for future in as_completed(futures):
+            _merge(merged, future.result())
+
+    with app.app_context():
+        top_ids = [fid for fid, _ in merged['food_counts'].most_common(20)]
+        food_names = dict(db.session.query(Food.id, Food.name).filter(Food.id.in_(top_ids))) if top_ids else {}
+
+    report = build_report(food_names, merged, args.days)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, time.perf_counter() - started)
+
+
+if __name__ == '__main__':
+    main()
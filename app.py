@@ -1,17 +1,33 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import (Flask, render_template, request, redirect, url_for, flash, jsonify, Response,
+                   stream_with_context, make_response)
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from datetime import datetime, date
-from io import BytesIO
+from sqlalchemy.orm import joinedload
+from io import BytesIO, TextIOWrapper
+import json
+import tempfile
 import os
 import sys
 import google.generativeai as genai
 import markdown
 from config import Config
-from model import db, User, Food, FoodLog, FavoriteFood
+from model import db, User, Food, FoodLog, FoodServing
 from utils import (
     load_nutrition_data, get_daily_summary, get_weekly_data,
-    get_meal_breakdown, get_recent_foods, export_food_diary_csv, get_streak_badge
+    get_meal_breakdown, get_recent_foods, export_food_diary_csv, get_streak_badge,
+    get_food_units, get_nutrient_report, upgrade_schema, backfill_food_nutrients
 )
+from catalog import DIET_PREFERENCES, get_catalog, invalidate_catalog, suggest_foods
+from meal_planner import generate_meal_plan
+from diary_import import import_diary
+from weight_trends import get_latest_weight, get_weight_trend, log_weight
+from compression import compress_response
+from db_routing import expect_writes, replica_reads, remember_writes
+from auth import HashingBusy, SlidingWindowThrottle, needs_rehash
+from favorites import favorite_foods, favorite_ids, get_favorites, is_favorite, set_favorite
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -71,8 +87,49 @@ def inject_now():
     return {'now': datetime.now()} # Bracket yahan honge, template mein nahi
 app.config.from_object(Config)
 
+# Trust X-Forwarded-For only from our own proxies (client IPs feed the login throttles)
+if app.config['PROXY_COUNT']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_COUNT'], x_proto=app.config['PROXY_COUNT'])
+
+# Persist compiled templates across worker restarts
+os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR'])
+
+
+# ============================================================================
+# RESPONSE COMPRESSION & FRAGMENT CACHE
+# ============================================================================
+
+_fragment_cache = {}
+
+
+@app.template_global()
+def cached_fragment(template_name, **key):
+    """Render a static partial once per process (and per `key` values).
+
+    Only for markup that never depends on the current user or request
+    data other than what is passed in `key`.
+    """
+    cache_key = (template_name, tuple(sorted(key.items())))
+    html = _fragment_cache.get(cache_key)
+    if html is None:
+        html = Markup(render_template(template_name, **key))
+        _fragment_cache[cache_key] = html
+    return html
+
+
+@app.after_request
+def compress(response):
+    return compress_response(
+        response,
+        min_size=app.config['COMPRESS_MIN_SIZE'],
+        mimetypes=app.config['COMPRESS_MIMETYPES'],
+        gzip_level=app.config['COMPRESS_LEVEL']
+    )
+
 # Initialize extensions
 db.init_app(app)
+app.after_request(remember_writes)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -95,6 +152,11 @@ def init_database():
         # Create all tables
         db.create_all()
         
+        # Bring databases created by older versions up to date
+        added = upgrade_schema()
+        if added:
+            print(f"Added columns: {', '.join(added)}")
+        
         # Load nutrition data if foods table is empty
         if Food.query.count() == 0:
             csv_path = app.config['NUTRITION_CSV_PATH']
@@ -108,6 +170,10 @@ def init_database():
                 print(f"Warning: Nutrition CSV not found at {csv_path}")
                 # Create sample data for demo
                 create_sample_foods()
+        else:
+            backfilled = backfill_food_nutrients(app.config['NUTRITION_CSV_PATH'])
+            if backfilled:
+                print(f"Backfilled nutrient profiles for {backfilled} foods")
 
 
 def create_sample_foods():
@@ -161,6 +227,7 @@ def create_sample_foods():
         db.session.add(food)
     
     db.session.commit()
+    invalidate_catalog()
     print(f"Created {len(sample_foods)} sample foods")
 
 
@@ -176,6 +243,20 @@ def index():
     return redirect(url_for('login'))
 
 
+# Login/register throttles, checked before any hashing or DB work
+login_ip_throttle = SlidingWindowThrottle(*app.config['LOGIN_IP_LIMIT'])
+login_account_throttle = SlidingWindowThrottle(*app.config['LOGIN_ACCOUNT_LIMIT'])
+register_ip_throttle = SlidingWindowThrottle(*app.config['REGISTER_IP_LIMIT'])
+
+
+def auth_unavailable(template, message, status, retry_after):
+    """Re-render an auth form with a flash, an error status and Retry-After"""
+    flash(message, 'danger')
+    response = make_response(render_template(template), status)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     """User registration"""
@@ -183,6 +264,11 @@ def register():
         return redirect(url_for('dashboard'))
     
     if request.method == 'POST':
+        wait = register_ip_throttle.retry_after(request.remote_addr)
+        if wait:
+            return auth_unavailable('register.html', 'Too many sign-ups from this network. Please try again later.',
+                                    429, wait)
+        
         email = request.form.get('email', '').strip().lower()
         username = request.form.get('username', '').strip()
         password = request.form.get('password', '')
@@ -211,8 +297,12 @@ def register():
             return render_template('register.html')
         
         # Create new user
+        register_ip_throttle.hit(request.remote_addr)
         user = User(email=email, username=username)
-        user.set_password(password)
+        try:
+            user.set_password(password)
+        except HashingBusy:
+            return auth_unavailable('register.html', 'The server is busy. Please try again in a moment.', 503, 5)
         
         db.session.add(user)
         db.session.commit()
@@ -234,16 +324,35 @@ def login():
         password = request.form.get('password', '')
         remember = request.form.get('remember', False)
         
+        wait = max(login_ip_throttle.retry_after(request.remote_addr), login_account_throttle.retry_after(email))
+        if wait:
+            return auth_unavailable('login.html', 'Too many login attempts. Please try again later.', 429, wait)
+        login_ip_throttle.hit(request.remote_addr)
+        
         user = User.query.filter_by(email=email).first()
         
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and user.check_password(password)
+        except HashingBusy:
+            return auth_unavailable('login.html', 'The server is busy. Please try again in a moment.', 503, 5)
+        
+        if valid:
+            login_account_throttle.reset(email)
             login_user(user, remember=remember)
             user.last_login = datetime.utcnow()
+            
+            # Upgrade hashes made with older parameters while we have the password
+            if needs_rehash(user.password_hash):
+                try:
+                    user.set_password(password)
+                except HashingBusy:
+                    pass
             db.session.commit()
             
             next_page = request.args.get('next')
             return redirect(next_page) if next_page else redirect(url_for('dashboard'))
         else:
+            login_account_throttle.hit(email)
             flash('Invalid email or password', 'danger')
     
     return render_template('login.html')
@@ -264,6 +373,7 @@ def logout():
 
 @app.route('/dashboard')
 @login_required
+@replica_reads()
 def dashboard():
     """Main nutrition tracking dashboard"""
     # Update streak
@@ -308,8 +418,8 @@ def dashboard():
     # Streak badge
     streak_emoji, streak_text = get_streak_badge(current_user.current_streak)
     
-    # Favorites
-    favorites = [fav.food for fav in current_user.favorites.all()]
+    # Favorites (from the cached bitmap, no queries)
+    favorites = favorite_foods(current_user.id)
     
     return render_template('dashboard.html',
         today_summary=today_summary,
@@ -324,7 +434,9 @@ def dashboard():
         fat_percentage=fat_percentage,
         streak_emoji=streak_emoji,
         streak_text=streak_text,
-        favorites=favorites
+        favorites=favorites,
+        favorite_ids=[food['id'] for food in favorites],
+        catalog_version=get_catalog().version
     )
 
 
@@ -344,6 +456,8 @@ def profile():
         current_user.height = float(request.form.get('height', 170))
         current_user.activity_level = request.form.get('activity_level', 'moderate')
         current_user.goal = request.form.get('goal', 'maintain')
+        diet_preference = request.form.get('diet_preference')
+        current_user.diet_preference = diet_preference if diet_preference in DIET_PREFERENCES else None
         
         # Recalculate targets
         current_user.calculate_targets()
@@ -361,6 +475,7 @@ def profile():
 
 @app.route('/api/search-food')
 @login_required
+@replica_reads()
 def search_food():
     """Search food database"""
     query = request.args.get('q', '').strip()
@@ -373,18 +488,60 @@ def search_food():
         Food.name.ilike(f'%{query}%')
     ).limit(20).all()
     
+    units = get_food_units([food.id for food in foods])
+    catalog = get_catalog()
+    favorites = get_favorites(current_user.id, catalog)
+    
     results = [{
         'id': food.id,
         'name': food.name,
         'calories': food.calories,
         'protein': food.protein,
         'carbs': food.carbs,
-        'fat': food.fat
+        'fat': food.fat,
+        'units': units[food.id],
+        'is_favorite': is_favorite(favorites, food.id, catalog)
     } for food in foods]
     
     return jsonify(results)
 
 
+# Approximate weights for generic units, used only when a food has no
+# matching FoodServing row (e.g. the built-in sample foods)
+GENERIC_UNIT_GRAMS = {'bowl': 180.0, 'cup': 240.0, 'pc': 60.0}
+
+
+@app.route('/api/catalog-snapshot')
+@login_required
+@replica_reads()
+def catalog_snapshot():
+    """Compressed food catalog for client-side search, cached by version"""
+    catalog = get_catalog()
+    use_gzip = 'gzip' in request.accept_encodings
+    # Each encoding is a different representation, so it gets its own ETag
+    etag = f'{catalog.version}-gzip' if use_gzip else catalog.version
+    
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        raw, gzipped = catalog.snapshot()
+        if use_gzip:
+            response = make_response(gzipped)
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = make_response(raw)
+        response.mimetype = 'application/json'
+    
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    # Versioned URLs never change; the bare URL must be revalidated
+    if request.args.get('v') == catalog.version:
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 @app.route('/api/log-food', methods=['POST'])
 @login_required
 def log_food():
@@ -400,33 +557,36 @@ def log_food():
     if not food_id or raw_quantity <= 0:
         return jsonify({'success': False, 'error': 'Invalid input'}), 400
     
-    food = Food.query.get(food_id)
+    # Food-specific serving (bowl, plate, piece...) with exact per-serving nutrients
+    serving = None
+    if unit not in ('g', 'ml'):
+        serving = FoodServing.query.options(joinedload(FoodServing.food)).filter_by(
+            food_id=food_id, unit=unit).first()
+    
+    food = serving.food if serving else Food.query.get(food_id)
     if not food:
         return jsonify({'success': False, 'error': 'Food not found'}), 404
 
-    # --- NEW CONVERSION LOGIC BLOCK ---
-    multiplier = 1.0
-    if unit == 'bowl': multiplier = 180.0  # 1 bowl approx 180g
-    elif unit == 'cup': multiplier = 240.0 # 1 cup approx 240g
-    elif unit == 'pc': multiplier = 60.0   # 1 piece approx 60g
-    
-    # Final quantity for database calculation
-    final_quantity = raw_quantity * (multiplier if unit not in ['g', 'ml'] else 1.0)
-    # ----------------------------------
+    # Generic units for foods without a matching serving row
+    multiplier = 1.0 if unit in ('g', 'ml') else GENERIC_UNIT_GRAMS.get(unit)
+    if not serving and multiplier is None:
+        return jsonify({'success': False, 'error': f'Unknown unit: {unit}'}), 400
 
     try:
-        # Humne upar 'food' object pehle hi fetch kiya hai (Line 273 par)
+        # Humne upar 'food' object pehle hi fetch kiya hai
         # Usi object ko direct pass karein taaki relationship turant available ho
         log = FoodLog(
             user_id=current_user.id,
-            food=food,  # <--- CHANGE: 'food_id' ki jagah 'food' object pass karein
-            quantity=final_quantity, 
+            food=food,
+            quantity=raw_quantity * (multiplier or 1.0),
             meal_type=meal_type,
             logged_at=datetime.now()
         )
         
-        # Ab kyunki humne 'food' object pass kiya hai, ye function sahi chalega
-        log.calculate_nutrition() 
+        if serving:
+            log.apply_serving(serving, raw_quantity)
+        else:
+            log.calculate_nutrition()
         
         db.session.add(log)
         db.session.commit()
@@ -440,6 +600,77 @@ def log_food():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/suggest')
+@login_required
+@replica_reads()
+def suggest():
+    """Suggest foods and portions that best fill today's remaining macros"""
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    today_summary = get_daily_summary(current_user.id)
+    
+    remaining = {
+        'calories': current_user.daily_calorie_target - today_summary['calories'],
+        'protein': current_user.protein_target - today_summary['protein'],
+        'carbs': current_user.carbs_target - today_summary['carbs'],
+        'fat': current_user.fat_target - today_summary['fat']
+    }
+    
+    targets = {
+        'calories': current_user.daily_calorie_target,
+        'protein': current_user.protein_target,
+        'carbs': current_user.carbs_target,
+        'fat': current_user.fat_target
+    }
+    
+    suggestions = suggest_foods(
+        remaining,
+        targets=targets,
+        diet_preference=current_user.diet_preference,
+        favorite_ids=favorite_ids(current_user.id),
+        limit=limit
+    )
+    
+    return jsonify({'remaining': remaining, 'suggestions': suggestions})
+
+
+@app.route('/api/meal-plan')
+@login_required
+@replica_reads()
+def meal_plan():
+    """Generate a full-day meal plan that hits the user's targets"""
+    targets = {
+        'calories': current_user.daily_calorie_target,
+        'protein': current_user.protein_target,
+        'carbs': current_user.carbs_target,
+        'fat': current_user.fat_target
+    }
+    
+    plan = generate_meal_plan(
+        targets,
+        diet_preference=current_user.diet_preference,
+        sodium_limit_mg=app.config['SODIUM_LIMIT_MG'],
+        cholesterol_limit_mg=app.config['CHOLESTEROL_LIMIT_MG'],
+        time_budget_ms=app.config['MEAL_PLAN_TIME_BUDGET_MS'],
+        use_cache=not request.args.get('refresh', type=int)
+    )
+    
+    return jsonify(plan)
+
+
+@app.route('/api/nutrient-report')
+@login_required
+@replica_reads()
+def nutrient_report():
+    """Full nutrient totals (minerals, vitamins, fatty acids) for a day"""
+    day = request.args.get('date')
+    try:
+        target_date = datetime.strptime(day, '%Y-%m-%d').date() if day else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid date'}), 400
+    
+    return jsonify(get_nutrient_report(current_user.id, target_date))
+
+
 @app.route('/api/delete-log/<int:log_id>', methods=['DELETE'])
 @login_required
 def delete_log(log_id):
@@ -458,28 +689,69 @@ def delete_log(log_id):
 @app.route('/api/toggle-favorite/<int:food_id>', methods=['POST'])
 @login_required
 def toggle_favorite(food_id):
-    """Add or remove food from favorites"""
-    food = Food.query.get(food_id)
-    if not food:
+    """Add or remove food from favorites.
+
+    An optional JSON body {"favorite": true/false} sets the state explicitly,
+    so repeated or out-of-order clicks are idempotent.
+    """
+    data = request.get_json(silent=True) or {}
+    if 'favorite' in data:
+        favorite = bool(data['favorite'])
+    else:
+        catalog = get_catalog()
+        favorite = not is_favorite(get_favorites(current_user.id, catalog), food_id, catalog)
+    
+    if not set_favorite(current_user.id, food_id, favorite):
         return jsonify({'success': False, 'error': 'Food not found'}), 404
     
-    # Check if already favorite
-    favorite = FavoriteFood.query.filter_by(
-        user_id=current_user.id,
-        food_id=food_id
-    ).first()
+    return jsonify({'success': True, 'action': 'added' if favorite else 'removed', 'favorite': favorite})
+
+
+# ============================================================================
+# WEIGHT TRACKING
+# ============================================================================
+
+@app.route('/api/weight', methods=['POST'])
+@login_required
+def add_weight():
+    """Log a weigh-in"""
+    data = request.get_json() or {}
+    
+    try:
+        weight = float(data.get('weight', 0))
+        logged_at = datetime.strptime(data['date'], '%Y-%m-%d') if data.get('date') else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Invalid input'}), 400
     
-    if favorite:
-        # Remove favorite
-        db.session.delete(favorite)
-        db.session.commit()
-        return jsonify({'success': True, 'action': 'removed'})
-    else:
-        # Add favorite
-        favorite = FavoriteFood(user_id=current_user.id, food_id=food_id)
-        db.session.add(favorite)
-        db.session.commit()
-        return jsonify({'success': True, 'action': 'added'})
+    notes = data.get('notes')
+    if notes is not None and not isinstance(notes, str):
+        return jsonify({'success': False, 'error': 'Invalid input'}), 400
+    
+    if not 20 <= weight <= 400:
+        return jsonify({'success': False, 'error': 'Invalid weight'}), 400
+    
+    entry = log_weight(current_user, weight, notes=(notes or '')[:200] or None, logged_at=logged_at)
+    
+    return jsonify({
+        'success': True,
+        'entry': {'id': entry.id, 'weight': entry.weight, 'date': entry.logged_at.isoformat()},
+        'latest': get_latest_weight(current_user.id, app.config['WEIGHT_SMOOTHING_ALPHA'])
+    })
+
+
+@app.route('/api/weight/trend')
+@login_required
+@replica_reads()
+def weight_trend():
+    """Weight history with smoothed trend, downsampled for charting"""
+    days = min(max(request.args.get('days', 365, type=int), 1), 3650)
+    max_points = app.config['WEIGHT_TREND_MAX_POINTS']
+    points = min(max(request.args.get('points', max_points, type=int), 3), max_points)
+    alpha = app.config['WEIGHT_SMOOTHING_ALPHA']
+    
+    trend = get_weight_trend(current_user.id, days=days, max_points=points, alpha=alpha)
+    trend['latest'] = get_latest_weight(current_user.id, alpha)
+    return jsonify(trend)
 
 
 # ============================================================================
@@ -488,25 +760,51 @@ def toggle_favorite(food_id):
 
 @app.route('/export-csv')
 @login_required
+@replica_reads()
 def export_csv():
     """Export food diary as CSV"""
     days = request.args.get('days', 30, type=int)
     
     df = export_food_diary_csv(current_user.id, days)
     
-    # Create CSV in memory
+    # Create CSV in memory (a regular body, so it can be compressed)
     output = BytesIO()
     df.to_csv(output, index=False, encoding='utf-8')
-    output.seek(0)
     
     filename = f'nutritrack_export_{datetime.now().strftime("%Y%m%d")}.csv'
     
-    return send_file(
-        output,
-        output_name=filename,
-        mimetype='text/csv',
-        as_attachment=True
-    )
+    response = make_response(output.getvalue())
+    response.mimetype = 'text/csv'
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
+@app.route('/import-csv', methods=['POST'])
+@login_required
+def import_csv():
+    """Import a food diary CSV, streaming progress back as JSON lines"""
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+    
+    user_id = current_user.id
+    chunk_size = app.config['IMPORT_CHUNK_SIZE']
+    
+    # Werkzeug closes the upload once the view returns, so spool it (chunked,
+    # never fully in memory) to a temp file the streaming generator owns
+    spooled = tempfile.TemporaryFile()
+    upload.save(spooled)
+    spooled.seek(0)
+    
+    # Rows are written after the response (and session cookie) has gone out
+    expect_writes(app.config['IMPORT_PRIMARY_READS_SECONDS'])
+    
+    def generate():
+        with TextIOWrapper(spooled, encoding='utf-8-sig', errors='replace', newline='') as text:
+            for progress in import_diary(user_id, text, chunk_size=chunk_size):
+                yield json.dumps(progress) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 
 # ============================================================================
@@ -0,0 +1,18 @@
+import argparse
+from app import app
+from utils import archive_old_logs
+
+parser = argparse.ArgumentParser(description='Move old food logs into the archive table')
+parser.add_argument('--days', type=int, default=None,
+                    help='Retention horizon in days (default: LOG_RETENTION_DAYS)')
+parser.add_argument('--batch-size', type=int, default=5000)
+args = parser.parse_args()
+
+with app.app_context():
+    days = args.days if args.days is not None else app.config['LOG_RETENTION_DAYS']
+    print(f"Archiving food logs older than {days} days...")
+    
+    moved = archive_old_logs(days, batch_size=args.batch_size,
+                             progress=lambda n: print(f"  ... {n} logs archived"))
+    
+    print(f"✅ Archived {moved} logs")
@@ -0,0 +1,139 @@
+"""Password hashing off the request thread, plus in-memory login throttles.
+
+Hashing (scrypt by default: ~32 MB and tens of ms of CPU per call) runs on
+a small shared thread pool. hashlib releases the GIL while it works, so the
+pool size is a hard cap on the CPU and memory that authentication can use,
+however many login or register posts arrive at once. When too many hashes
+are already queued, callers get HashingBusy straight away instead of
+waiting behind them.
+
+This only caps anything when a process serves several requests at once,
+so the Procfile runs gunicorn's gthread workers with more threads than
+PASSWORD_HASH_MAX_PENDING. With sync workers (one request per process)
+the pool never fills up.
+
+The throttles keep per-key timestamps in process memory. Each gunicorn
+worker enforces its own limits.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULTS = {
+    'PASSWORD_HASH_METHOD': 'scrypt:32768:8:1',
+    'PASSWORD_HASH_WORKERS': 2,
+    'PASSWORD_HASH_MAX_PENDING': 4,
+    'PASSWORD_HASH_TIMEOUT': 10,
+}
+
+_pool = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool is saturated or a hash took too long"""
+
+
+def _setting(key):
+    if has_app_context():
+        return current_app.config.get(key, DEFAULTS[key])
+    return DEFAULTS[key]
+
+
+def _get_pool():
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is None:
+            workers = _setting('PASSWORD_HASH_WORKERS')
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+            _pool_slots = threading.BoundedSemaphore(max(workers, _setting('PASSWORD_HASH_MAX_PENDING')))
+        return _pool, _pool_slots
+
+
+def _run(fn, *args):
+    pool, slots = _get_pool()
+    if not slots.acquire(blocking=False):
+        raise HashingBusy('Too many password hashes in flight')
+    try:
+        future = pool.submit(fn, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=_setting('PASSWORD_HASH_TIMEOUT'))
+    except FutureTimeout:
+        raise HashingBusy('Password hashing timed out') from None
+
+
+def hash_password(password):
+    """Hash with the configured PASSWORD_HASH_METHOD on the hashing pool"""
+    return _run(generate_password_hash, password, _setting('PASSWORD_HASH_METHOD'))
+
+
+def verify_password(password_hash, password):
+    """check_password_hash on the hashing pool"""
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """True if the stored hash was made with parameters other than the configured ones.
+
+    PASSWORD_HASH_METHOD must be spelled out in full (e.g. 'scrypt:32768:8:1',
+    'pbkdf2:sha256:1000000'), the way werkzeug writes it into the hash.
+    """
+    return password_hash.split('$', 1)[0] != _setting('PASSWORD_HASH_METHOD')
+
+
+class SlidingWindowThrottle:
+    """At most `limit` hits per key within any `window` seconds"""
+
+    def __init__(self, limit, window, max_keys=100000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, hits, now):
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+
+    def retry_after(self, key):
+        """Seconds until `key` may try again; 0 if it is under the limit now"""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if not hits:
+                return 0
+            self._prune(hits, now)
+            if len(hits) < self.limit:
+                return 0
+            return max(1, int(hits[0] + self.window - now) + 1)
+
+    def hit(self, key):
+        now = time.monotonic()
+        with self._lock:
+            if key not in self._hits and len(self._hits) >= self.max_keys:
+                self._sweep(now)
+            hits = self._hits.setdefault(key, deque())
+            self._prune(hits, now)
+            hits.append(now)
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def _sweep(self, now):
+        # Drop idle keys; if that frees nothing, forget the oldest half
+        for key in [k for k, hits in self._hits.items() if not hits or hits[-1] <= now - self.window]:
+            del self._hits[key]
+        if len(self._hits) >= self.max_keys:
+            oldest = sorted(self._hits, key=lambda k: self._hits[k][-1])
+            for key in oldest[:len(oldest) // 2]:
+                del self._hits[key]
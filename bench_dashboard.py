@@ -0,0 +1,87 @@
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+# Benchmark against a throwaway SQLite database, never the configured one
+_tmp_dir = tempfile.mkdtemp(prefix='nutritrack-bench-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+os.environ['JINJA_BYTECODE_CACHE_DIR'] = os.path.join(_tmp_dir, 'jinja')
+
+from app import app, db, init_database, _fragment_cache
+from model import User, Food
+
+parser = argparse.ArgumentParser(description='Measure render time and bytes on the wire')
+parser.add_argument('--requests', type=int, default=50, help='Requests per endpoint')
+args = parser.parse_args()
+
+ENDPOINTS = ['/dashboard', '/profile', '/api/search-food?q=dal', '/api/suggest', '/export-csv?days=30']
+
+
+def timed_get(client, url, encoding):
+    headers = {'Accept-Encoding': encoding} if encoding else {}
+    started = time.perf_counter()
+    response = client.get(url, headers=headers)
+    return (time.perf_counter() - started) * 1000, len(response.get_data()), response.status_code
+
+
+try:
+    init_database()
+    with app.app_context():
+        user = User(email='bench@nutritrack.local', username='bench', age=30, gender='female',
+                    weight=62, height=165, activity_level='moderate', goal='maintain')
+        user.set_password('benchmark')
+        user.calculate_targets()
+        db.session.add(user)
+        db.session.commit()
+        food_ids = [f.id for f in Food.query.limit(12).all()]
+
+    client = app.test_client()
+    client.post('/login', data={'email': 'bench@nutritrack.local', 'password': 'benchmark'})
+    for i, food_id in enumerate(food_ids):
+        client.post('/api/log-food', json={'food_id': food_id, 'quantity': 150, 'unit': 'g',
+                                           'meal_type': ('breakfast', 'lunch', 'dinner', 'snack')[i % 4]})
+
+    # Cold template compile: no bytecode cache vs a warm one
+    env = app.jinja_env
+    bytecode_cache, env.bytecode_cache = env.bytecode_cache, None
+    env.cache.clear()
+    started = time.perf_counter()
+    env.get_template('dashboard.html')
+    no_cache_ms = (time.perf_counter() - started) * 1000
+    env.bytecode_cache = bytecode_cache
+    env.cache.clear()
+    env.get_template('dashboard.html')  # populate the bytecode cache
+    env.cache.clear()
+    started = time.perf_counter()
+    env.get_template('dashboard.html')
+    cached_ms = (time.perf_counter() - started) * 1000
+    print(f"Template load (dashboard.html, cold): {no_cache_ms:.1f} ms compiled, {cached_ms:.1f} ms from bytecode cache\n")
+
+    print(f"{'endpoint':<28}{'identity':>12}{'gzip':>12}{'ratio':>8}{'mean ms':>10}{'p95 ms':>9}")
+    for url in ENDPOINTS:
+        _, raw_bytes, status = timed_get(client, url, None)
+        timings = []
+        for _ in range(args.requests):
+            ms, gz_bytes, status = timed_get(client, url, 'gzip')
+            timings.append(ms)
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        ratio = gz_bytes / raw_bytes if raw_bytes else 1
+        print(f"{url:<28}{raw_bytes:>12,}{gz_bytes:>12,}{ratio:>8.2f}{statistics.mean(timings):>10.2f}{p95:>9.2f}")
+
+    # Dashboard render with and without the fragment cache
+    def mean_dashboard_ms():
+        return statistics.mean(timed_get(client, '/dashboard', None)[0] for _ in range(args.requests))
+
+    cached = mean_dashboard_ms()
+    uncached = []
+    for _ in range(args.requests):
+        _fragment_cache.clear()
+        uncached.append(timed_get(client, '/dashboard', None)[0])
+    print(f"\n/dashboard render: {cached:.2f} ms with fragment cache, "
+          f"{statistics.mean(uncached):.2f} ms without")
+finally:
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
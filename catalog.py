@@ -0,0 +1,331 @@
+import gzip
+import hashlib
+import json
+import re
+import threading
+import time
+import numpy as np
+from sqlalchemy import Integer, cast, func
+from model import db, Food, FoodServing
+
+# Nutrient columns kept in the in-memory matrix (all per 100g, same as Food)
+CATALOG_FIELDS = ('calories', 'protein', 'carbs', 'fat',
+                  'cholesterol_mg', 'sodium_mg', 'fibre_g', 'vitc_mg', 'vita_ug', 'iron_mg')
+MACRO_COLS = slice(0, 4)
+
+# Name keywords used to tag foods for diet_preference filtering
+NON_VEG_KEYWORDS = ('chicken', 'mutton', 'lamb', 'beef', 'pork', 'ham', 'bacon', 'fish', 'prawn',
+                    'shrimp', 'crab', 'tuna', 'salmon', 'keema', 'kheema', 'meat', 'liver', 'sausage',
+                    'boti', 'chop', 'salami', 'pepperoni', 'shammi', 'turkey', 'duck', 'goat', 'nihari',
+                    'paya', 'haleem', 'gelatin', 'aspic', 'brown stock', 'white stock', 'mixed stock',
+                    'club sandwich', 'roghan josh', 'rogan josh', 'jellied')
+EGG_KEYWORDS = ('egg', 'omelette', 'omelet', 'omlet', 'custard', 'souffle', 'meringue', 'mayonnaise',
+                'mousse', 'chiffon', 'eclair', 'choux', 'tartare')
+# Curated tags for dishes whose names don't give them away (normalize_name -> tag)
+DIET_TAG_OVERRIDES = {
+    'sponge cake': 'egg', 'chocolate sponge cake': 'egg', 'victorian sandwich cake': 'egg',
+    'marble cake': 'egg', 'dundee cake': 'egg', 'christmas cake': 'egg', 'plain cream cake': 'egg',
+    'chocolate cake': 'egg', 'orange cake': 'egg', 'lemon cake': 'egg', 'queen of pudding': 'egg',
+    'bread and butter pudding': 'egg', 'pineapple upside down pudding': 'egg', 'cheese pudding': 'egg',
+    'pancake': 'egg', 'jam and fruit pancake': 'egg', 'cheese and tomato pancake': 'egg',
+}
+# Names that say they are meat/egg free override both lists above
+# ("Eggless cake", "Mayonnaise without eggs", "Vegetarian club sandwich")
+VEG_OVERRIDE_KEYWORDS = ('eggless', 'without egg', 'egg free', 'vegetarian', 'vegeterian')
+
+DIET_PREFERENCES = ('vegetarian', 'eggetarian', 'non_vegetarian')
+
+# Condiments, spice mixes and bases that aren't eaten as a portion on their
+# own; never suggested or planned
+CONDIMENT_KEYWORDS = ('powder', 'chutney', 'pickle', 'pickled', 'achar', 'sauce', 'stock', 'aspic',
+                      'dressing', 'dip', 'gravy', 'paste', 'essence', 'garam masala', 'chat masala',
+                      'kashmiri masala', 'pav bhaji masala', 'spice blend')
+
+# Suggestions fill at most one meal: the largest MEAL_SPLIT share
+SUGGESTION_MEAL_SHARE = 0.35
+SERVING_CAP = 2  # at most this many of a food's own servings per suggestion
+MIN_CALORIE_SHARE = 0.15  # of the meal's remaining calories
+# Fallback daily targets, the User column defaults
+DEFAULT_TARGETS = {'calories': 2000, 'protein': 150, 'carbs': 200, 'fat': 65}
+
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def _tokens(name):
+    return _TOKEN_RE.findall(name.lower())
+
+
+def normalize_name(name):
+    return ' '.join(_tokens(name))
+
+
+def keyword_mask(names, keywords):
+    # Whole words, allowing plurals: "eggs" matches egg, "eggplant" doesn't
+    pattern = re.compile(r'\b(?:' + '|'.join(keywords) + r')(?:e?s)?\b', re.IGNORECASE)
+    return np.fromiter((bool(pattern.search(n)) for n in names), dtype=bool, count=len(names))
+
+
+class FoodCatalog:
+    """Read-only, column-oriented snapshot of the foods table"""
+
+    def __init__(self, ids, names, matrix, servings=None):
+        self.servings = servings or {}          # food_id -> [(unit, grams), ...]
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.names = list(names)
+        self.matrix = np.asarray(matrix, dtype=np.float64).reshape(len(self.ids), len(CATALOG_FIELDS))
+        self.row_of = {int(fid): i for i, fid in enumerate(self.ids)}
+
+        veg_override = keyword_mask(self.names, VEG_OVERRIDE_KEYWORDS)
+        self.is_non_veg = keyword_mask(self.names, NON_VEG_KEYWORDS) & ~veg_override
+        self.has_egg = keyword_mask(self.names, EGG_KEYWORDS) & ~self.is_non_veg & ~veg_override
+        for i, name in enumerate(self.names):
+            tag = DIET_TAG_OVERRIDES.get(normalize_name(name))
+            if tag is not None:
+                self.is_non_veg[i] = tag == 'non_veg'
+                self.has_egg[i] = tag == 'egg'
+
+        self.is_condiment = keyword_mask(self.names, CONDIMENT_KEYWORDS)
+
+        # Macro vectors per gram, reused by every scoring call
+        self.macros_per_g = self.matrix[:, MACRO_COLS] / 100.0
+
+        # Largest food-specific serving per row (nan where none), to size portions
+        self.serving_grams = np.full(len(self.ids), np.nan)
+        for food_id, units in self.servings.items():
+            row = self.row_of.get(food_id)
+            if row is not None and units:
+                self.serving_grams[row] = max(g for _, g in units)
+
+        # Name search index: exact normalised names plus token -> rows
+        self.name_index = {}
+        self.token_index = {}
+        for i, name in enumerate(self.names):
+            self.name_index.setdefault(normalize_name(name), i)
+            for token in set(_tokens(name)):
+                self.token_index.setdefault(token, []).append(i)
+
+        # Content hash, changes whenever the foods table changes
+        digest = hashlib.sha1(self.ids.tobytes())
+        digest.update(self.matrix.tobytes())
+        digest.update('\x00'.join(self.names).encode('utf-8'))
+        digest.update(repr(sorted(self.servings.items())).encode('utf-8'))
+        self.version = digest.hexdigest()[:16]
+
+        self._snapshot = None
+        self._snapshot_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_db(cls):
+        cols = [Food.id, Food.name] + [getattr(Food, f) for f in CATALOG_FIELDS]
+        rows = db.session.query(*cols).order_by(Food.id).all()
+        ids = [r[0] for r in rows]
+        names = [r[1] for r in rows]
+        matrix = [[v or 0.0 for v in r[2:]] for r in rows]
+        servings = {}
+        for food_id, unit, grams in db.session.query(
+                FoodServing.food_id, FoodServing.unit, FoodServing.grams).order_by(FoodServing.id):
+            servings.setdefault(food_id, []).append((unit, grams))
+        return cls(ids, names, matrix, servings)
+
+    def snapshot(self):
+        """(json_bytes, gzip_bytes) of the client-side search snapshot, built once per version.
+
+        Column-oriented to keep it small: ids, names, per-100g macros and
+        food-specific serving units.
+        """
+        if self._snapshot is None:
+            with self._snapshot_lock:
+                if self._snapshot is None:
+                    macros = np.round(self.matrix[:, MACRO_COLS], 2)
+                    payload = {
+                        'version': self.version,
+                        'fields': list(CATALOG_FIELDS[MACRO_COLS]),
+                        'ids': self.ids.tolist(),
+                        'names': self.names,
+                        'values': [macros[:, i].tolist() for i in range(macros.shape[1])],
+                        'units': {str(fid): [[u, round(g, 1)] for u, g in units]
+                                  for fid, units in self.servings.items()}
+                    }
+                    raw = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+                    self._snapshot = (raw, gzip.compress(raw, compresslevel=9, mtime=0))
+        return self._snapshot
+
+    def diet_mask(self, diet_preference):
+        """Boolean mask of foods allowed for the given diet preference"""
+        if diet_preference == 'vegetarian':
+            return ~(self.is_non_veg | self.has_egg)
+        if diet_preference == 'eggetarian':
+            return ~self.is_non_veg
+        return np.ones(len(self), dtype=bool)
+
+    def match_name(self, name, min_similarity=0.5):
+        """Catalog row for a free-text food name, or None.
+
+        Exact (case/punctuation-insensitive) matches win; otherwise the row
+        sharing the largest fraction of word tokens with the query.
+        """
+        row = self.name_index.get(normalize_name(name))
+        if row is not None:
+            return row
+
+        query = set(_tokens(name))
+        if not query:
+            return None
+        overlap = {}
+        for token in query:
+            for i in self.token_index.get(token, ()):
+                overlap[i] = overlap.get(i, 0) + 1
+
+        best, best_score = None, 0.0
+        for i, shared in overlap.items():
+            score = shared / len(query | set(_tokens(self.names[i])))
+            if score > best_score:
+                best, best_score = i, score
+        return best if best_score >= min_similarity else None
+
+    def rows_for(self, food_ids):
+        return np.array([self.row_of[f] for f in food_ids if f in self.row_of], dtype=np.int64)
+
+
+# Other processes (workers, CLI loaders) can change the foods table, so a
+# cheap fingerprint query is re-run at most this often to detect it
+CATALOG_CHECK_INTERVAL = 30
+
+_catalog = None
+_catalog_fingerprint = None
+_catalog_checked_at = 0.0
+_catalog_lock = threading.Lock()
+
+
+def _scaled_sum(column):
+    # Sum of values scaled to integers: exact, unlike float sums whose last
+    # bits can vary between query plans
+    return func.coalesce(func.sum(cast(column * 100, Integer)), 0)
+
+
+def _foods_fingerprint():
+    """Aggregate over every value the catalog is built from.
+
+    Count and max(id) alone miss a CSV reload on SQLite, which reuses ids
+    1..N, so the food values, name lengths and servings are summed too.
+    """
+    foods = db.session.query(func.count(Food.id), func.max(Food.id), func.sum(func.length(Food.name)),
+                             *[_scaled_sum(getattr(Food, f)) for f in CATALOG_FIELDS]).one()
+    servings = db.session.query(func.count(FoodServing.id), _scaled_sum(FoodServing.grams)).one()
+    return tuple(foods) + tuple(servings)
+
+
+def get_catalog():
+    """Return the process-wide catalog, (re)building it when the foods table changed"""
+    global _catalog, _catalog_fingerprint, _catalog_checked_at
+    now = time.monotonic()
+    if _catalog is not None and now - _catalog_checked_at < CATALOG_CHECK_INTERVAL:
+        return _catalog
+
+    with _catalog_lock:
+        if _catalog is not None and now - _catalog_checked_at < CATALOG_CHECK_INTERVAL:
+            return _catalog
+        fingerprint = _foods_fingerprint()
+        if _catalog is None or fingerprint != _catalog_fingerprint:
+            _catalog = FoodCatalog.from_db()
+            _catalog_fingerprint = fingerprint
+        _catalog_checked_at = now
+    return _catalog
+
+
+def invalidate_catalog():
+    """Drop the cached catalog so the next call rebuilds it (after loading foods)"""
+    global _catalog
+    with _catalog_lock:
+        _catalog = None
+
+
+def fit_portions(macros_per_g, remaining, min_grams, max_grams, scale):
+    """Best portion (grams) and fit score of each row for a remaining macro vector.
+
+    Each macro is divided by `scale` (the user's daily targets), so a gram of
+    fat counts the same whether or not any fat is left to eat; the
+    least-squares portion is clipped to [min_grams, max_grams] (either may be
+    per row) and the score is the residual norm, with overshoot counted
+    double. Rows that cannot contribute anything score inf.
+    """
+    r = np.asarray(remaining, dtype=np.float64)
+    scale = np.maximum(np.asarray(scale, dtype=np.float64), 1.0)
+    x = macros_per_g / scale                  # (n, 4) per gram, normalised
+    rn = r / scale
+
+    denom = np.einsum('ij,ij->i', x, x)
+    grams = np.divide(x @ rn, denom, out=np.zeros_like(denom), where=denom > 0)
+    grams = np.clip(grams, min_grams, max_grams)
+
+    diff = x * grams[:, None] - rn
+    diff = np.where(diff > 0, 2.0 * diff, diff)
+    score = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+    score[denom <= 0] = np.inf
+    return grams, score
+
+
+def suggest_foods(remaining, targets=None, diet_preference=None, favorite_ids=(), limit=10,
+                  min_grams=30, max_grams=400, favorite_bonus=0.1):
+    """Rank foods by how well a single portion fills the remaining macros.
+
+    `remaining` and `targets` are dicts with calories/protein/carbs/fat: what
+    is still to eat today and the daily targets (DEFAULT_TARGETS if not
+    given). A portion is fitted against at most one meal's share of the
+    targets, so an empty day doesn't suggest a whole day's food in one
+    item; see fit_portions() for how portions are sized and scored.
+    """
+    catalog = get_catalog()
+    if len(catalog) == 0:
+        return []
+
+    fields = CATALOG_FIELDS[MACRO_COLS]
+    r = np.array([max(float(remaining.get(k, 0) or 0), 0.0) for k in fields])
+    if r[0] <= 0:
+        return []
+    targets = targets or DEFAULT_TARGETS
+    t = np.array([max(float(targets.get(k, 0) or 0), 1.0) for k in fields])
+    want = np.minimum(r, t * SUGGESTION_MEAL_SHARE)
+
+    # Foods with a known serving (a tablespoon of pickle, a bowl of dal) are
+    # capped at SERVING_CAP servings
+    cap = np.where(np.isnan(catalog.serving_grams), max_grams,
+                   np.clip(catalog.serving_grams * SERVING_CAP, min_grams, max_grams))
+    grams, score = fit_portions(catalog.macros_per_g, want, min_grams, cap, scale=t)
+    # A portion that leaves the meal no closer to its target, or barely dents
+    # its calories, isn't a suggestion
+    score[score >= np.linalg.norm(want / t)] = np.inf
+    score[catalog.macros_per_g[:, 0] * grams < MIN_CALORIE_SHARE * want[0]] = np.inf
+
+    fav_rows = catalog.rows_for(favorite_ids)
+    if len(fav_rows):
+        score[fav_rows] -= favorite_bonus
+
+    score[~catalog.diet_mask(diet_preference) | catalog.is_condiment] = np.inf
+
+    k = min(limit, int(np.isfinite(score).sum()))
+    if k == 0:
+        return []
+    top = np.argpartition(score, k - 1)[:k]
+    top = top[np.argsort(score[top])]
+
+    fav_set = set(int(i) for i in fav_rows)
+    results = []
+    for i in top:
+        g = float(round(grams[i] / 5) * 5)
+        portion = catalog.matrix[i, MACRO_COLS] * g / 100.0
+        results.append({
+            'id': int(catalog.ids[i]),
+            'name': catalog.names[i],
+            'grams': g,
+            'calories': round(float(portion[0]), 1),
+            'protein': round(float(portion[1]), 1),
+            'carbs': round(float(portion[2]), 1),
+            'fat': round(float(portion[3]), 1),
+            'is_favorite': int(i) in fav_set,
+        })
+    return results
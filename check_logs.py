@@ -1,4 +1,5 @@
 from app import app, db, FoodLog
+from model import FoodLogArchive, DailyRollup
 from datetime import datetime
 
 with app.app_context():
@@ -6,6 +7,7 @@ with app.app_context():
     logs = FoodLog.query.order_by(FoodLog.logged_at.desc()).limit(10).all()
     
     print(f"Total logs in database: {FoodLog.query.count()}")
+    print(f"Archived logs: {FoodLogArchive.query.count()} ({DailyRollup.query.count()} daily rollups)")
     print("\nLast 10 entries:")
     
     for log in logs:
@@ -0,0 +1,49 @@
+import gzip
+from flask import request
+
+# Optional: brotli is used when installed and the client accepts it
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def compress_response(response, min_size=500, mimetypes=(), gzip_level=6, brotli_quality=5):
+    """after_request hook: gzip/brotli-encode eligible responses in place.
+
+    Skips streamed and passthrough (send_file) bodies, already-encoded
+    responses, non-2xx statuses, other mimetypes and bodies under
+    `min_size` bytes, where the encoding overhead isn't worth it.
+    """
+    response.vary.add('Accept-Encoding')
+
+    if (response.status_code < 200 or response.status_code >= 300 or response.status_code == 204
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in mimetypes):
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        encoding = 'br'
+    elif accepted['gzip']:
+        encoding = 'gzip'
+    else:
+        return response
+
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=brotli_quality)
+    else:
+        compressed = gzip.compress(body, compresslevel=gzip_level)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    # The representation changed, so a strong validator no longer applies
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
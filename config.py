@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 
 # Get the base directory of the project
@@ -24,6 +25,20 @@ class Config:
     # Agar cloud URL mila toh wo use karega, nahi toh local sqlite use karega
     SQLALCHEMY_DATABASE_URI = database_url or f'sqlite:///{os.path.join(BASE_DIR, "nutritrack.db")}'
     
+    # Optional read replica. Read-only pages and reports are routed to it
+    # (see db_routing.py); locally, point it at a second SQLite file kept in
+    # sync with sync_replica.py.
+    replica_url = os.environ.get('DATABASE_REPLICA_URL')
+    
+    if replica_url and replica_url.startswith("postgres://"):
+        replica_url = replica_url.replace("postgres://", "postgresql://", 1)
+    
+    SQLALCHEMY_BINDS = {'replica': replica_url} if replica_url else {}
+    
+    # After a write, the same user reads from the primary for this long so
+    # replication lag never hides their own changes
+    REPLICA_READ_YOUR_WRITES_SECONDS = int(os.environ.get('REPLICA_READ_YOUR_WRITES_SECONDS', 10))
+    
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False  # Set True for SQL debugging
     
@@ -37,9 +52,80 @@ class Config:
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
     
+    # Number of reverse proxies in front of the app, so the client IP used by
+    # the login throttles comes from X-Forwarded-For. Render (which sets
+    # RENDER) and the Procfile deployment sit behind one proxy; without this
+    # every client shares the proxy's IP and the per-IP throttles would
+    # apply to the whole site at once.
+    PROXY_COUNT = int(os.environ.get('PROXY_COUNT', 1 if os.environ.get('RENDER') else 0))
+    
     # Application
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload
     JSON_SORT_KEYS = False
     
     # Data Path
-NUTRITION_CSV_PATH = os.path.join(BASE_DIR, 'nutrition_data.csv')
+    NUTRITION_CSV_PATH = os.path.join(BASE_DIR, 'nutrition_data.csv')
+    
+    # ============================================================
+    # AUTHENTICATION
+    # ============================================================
+    
+    # Full werkzeug method string; existing hashes made with other
+    # parameters are upgraded the next time their owner logs in
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    # The cap is per process and only bites with threaded workers: the Procfile
+    # runs gunicorn gthread with 8 threads, so at most 4 of them can be tied up
+    # by hashing and the rest keep serving other pages. Keep MAX_PENDING below
+    # the thread count if you change either.
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))  # concurrent hashes per process
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 4))  # running + queued; beyond this: 503
+    PASSWORD_HASH_TIMEOUT = 10  # seconds
+    
+    # Sliding-window throttles: (attempts, window in seconds)
+    LOGIN_IP_LIMIT = (20, 300)  # all login attempts from one IP
+    LOGIN_ACCOUNT_LIMIT = (5, 900)  # failed logins for one email, reset on success
+    REGISTER_IP_LIMIT = (5, 3600)
+    
+    # ============================================================
+    # RESPONSE COMPRESSION & TEMPLATE CACHING
+    # ============================================================
+    
+    COMPRESS_MIN_SIZE = 500  # bytes; smaller bodies go out uncompressed
+    COMPRESS_MIMETYPES = ('text/html', 'application/json', 'text/csv')
+    COMPRESS_LEVEL = 6
+    
+    # Compiled Jinja templates are persisted here so workers skip recompiling
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR') or \
+        os.path.join(tempfile.gettempdir(), 'nutritrack-jinja-cache')
+    
+    # ============================================================
+    # FOOD LOG RETENTION
+    # ============================================================
+    
+    # Logs older than this are moved to food_log_archive by archive_logs.py,
+    # leaving only per-day rollups for those days
+    LOG_RETENTION_DAYS = int(os.environ.get('LOG_RETENTION_DAYS', 180))
+    
+    # Rows per bulk INSERT when importing a diary CSV
+    IMPORT_CHUNK_SIZE = 1000
+    
+    # An import writes while its response streams, after the read-your-writes
+    # stamp would normally be set, so the importing user's reads stay on the
+    # primary (not the replica) for this long once it starts
+    IMPORT_PRIMARY_READS_SECONDS = 300
+    
+    # ============================================================
+    # WEIGHT TRACKING
+    # ============================================================
+    
+    WEIGHT_TREND_MAX_POINTS = 300  # cap on points sent to charts
+    WEIGHT_SMOOTHING_ALPHA = 0.1  # per-day EMA factor for the trend line
+    
+    # ============================================================
+    # MEAL PLANNER
+    # ============================================================
+    
+    MEAL_PLAN_TIME_BUDGET_MS = int(os.environ.get('MEAL_PLAN_TIME_BUDGET_MS', 150))
+    SODIUM_LIMIT_MG = 2300  # WHO daily upper limit
+    CHOLESTEROL_LIMIT_MG = 300
+
@@ -0,0 +1,95 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+import sqlalchemy as sa
+from sqlalchemy import event
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+
+# SQLALCHEMY_BINDS key of the read replica (see Config.SQLALCHEMY_BINDS)
+REPLICA_BIND = 'replica'
+
+# Flask session key holding the time of the user's last write
+LAST_WRITE_KEY = '_db_last_write'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def replica_reads():
+    """Allow plain SELECTs inside this block to go to the read replica.
+
+    Usable as a context manager or as a decorator (`@replica_reads()`).
+    Writes, reads after a write in the same request, and reads within
+    REPLICA_READ_YOUR_WRITES_SECONDS of the user's last write always go to
+    the primary.
+    """
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def _recent_write():
+    if not has_request_context():
+        return False
+    if g.get('_db_wrote'):
+        return True
+    last_write = session.get(LAST_WRITE_KEY)
+    window = current_app.config.get('REPLICA_READ_YOUR_WRITES_SECONDS', 10)
+    return bool(last_write) and time.time() - last_write < window
+
+
+class RoutingSession(Session):
+    """Session that sends replica-eligible SELECTs to the 'replica' bind"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica(clause):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self, clause):
+        if not _replica_reads.get() or self._flushing:
+            return False
+        if not isinstance(clause, sa.Select):
+            return False
+        if self.new or self.dirty or self.deleted:
+            return False
+        if REPLICA_BIND not in self._db.engines:
+            return False
+        return not _recent_write()
+
+
+def _mark_write():
+    if has_request_context():
+        g._db_wrote = True
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(db_session, flush_context):
+    _mark_write()
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _on_execute(orm_execute_state):
+    # Bulk Core-style writes (session.execute(insert/update/delete)) skip flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_write()
+
+
+def remember_writes(response):
+    """after_request hook: start the read-your-writes window after a write"""
+    if g.get('_db_wrote'):
+        session[LAST_WRITE_KEY] = max(time.time(), session.get(LAST_WRITE_KEY, 0))
+    return response
+
+
+def expect_writes(duration):
+    """Keep this user's reads on the primary for `duration` seconds from now.
+
+    For streamed responses that write after after_request has run, when the
+    session cookie can no longer be updated: call before returning the
+    response. The usual read-your-writes window is added on top.
+    """
+    session[LAST_WRITE_KEY] = max(time.time() + duration, session.get(LAST_WRITE_KEY, 0))
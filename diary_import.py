@@ -0,0 +1,121 @@
+import csv
+from datetime import datetime
+import numpy as np
+from model import db, FoodLog
+from catalog import CATALOG_FIELDS, get_catalog
+
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner', 'snack')
+
+# Accepted header names (lower-cased) for each diary column; our own
+# /export-csv format is included so exports can be re-imported
+COLUMN_ALIASES = {
+    'date': ('date', 'logged_at', 'datetime', 'time', 'day'),
+    'food': ('food', 'food_name', 'name', 'item', 'description'),
+    'quantity': ('quantity (g)', 'quantity', 'grams', 'amount', 'qty', 'weight'),
+    'meal': ('meal', 'meal_type', 'meal name')
+}
+
+DATE_FORMATS = ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+                '%d/%m/%Y %H:%M', '%d/%m/%Y', '%m/%d/%Y')
+
+
+def _parse_date(value):
+    value = (value or '').strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def _resolve_columns(fieldnames):
+    lowered = {(f or '').strip().lower(): f for f in fieldnames or ()}
+    columns = {}
+    for key, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in lowered:
+                columns[key] = lowered[alias]
+                break
+    return columns
+
+
+def _insert_chunk(user_id, parsed, catalog, stats, name_cache):
+    """Match names, compute nutrition for the whole chunk at once and bulk insert it"""
+    matched = []
+    for logged_at, food_name, grams, meal_type in parsed:
+        key = food_name.lower()
+        if key not in name_cache:
+            name_cache[key] = catalog.match_name(food_name)
+        row = name_cache[key]
+        if row is None:
+            stats['unmatched'] += 1
+            if len(stats['unmatched_names']) < 20 and food_name not in stats['unmatched_names']:
+                stats['unmatched_names'].append(food_name)
+            continue
+        matched.append((row, logged_at, grams, meal_type))
+    if not matched:
+        return
+
+    rows = np.array([m[0] for m in matched], dtype=np.int64)
+    grams = np.array([m[2] for m in matched], dtype=np.float64)
+    nutrition = np.round(catalog.matrix[rows] * (grams / 100.0)[:, None], 1)
+
+    records = []
+    for (row, logged_at, g, meal_type), values in zip(matched, nutrition.tolist()):
+        record = dict(zip(CATALOG_FIELDS, values))
+        record.update(user_id=user_id, food_id=int(catalog.ids[row]), quantity=g,
+                      meal_type=meal_type, logged_at=logged_at)
+        records.append(record)
+
+    db.session.execute(FoodLog.__table__.insert(), records)
+    db.session.commit()
+    stats['imported'] += len(records)
+
+
+def import_diary(user_id, text_stream, chunk_size=1000):
+    """Stream a diary CSV into food_logs, yielding a progress dict after each chunk.
+
+    Rows are read one at a time and inserted `chunk_size` at a time, so
+    memory use is bounded by the chunk, not the file. The last dict yielded
+    has done=True.
+    """
+    catalog = get_catalog()
+    reader = csv.DictReader(text_stream)
+    columns = _resolve_columns(reader.fieldnames)
+    stats = {'rows': 0, 'imported': 0, 'skipped': 0, 'unmatched': 0, 'unmatched_names': [], 'done': False}
+
+    if 'date' not in columns or 'food' not in columns:
+        stats.update(done=True, error='CSV needs at least a date and a food column')
+        yield stats
+        return
+
+    parsed = []
+    name_cache = {}
+    for record in reader:
+        stats['rows'] += 1
+        logged_at = _parse_date(record.get(columns['date']))
+        food_name = (record.get(columns['food']) or '').strip()
+        try:
+            grams = float(record.get(columns['quantity']) or 100) if 'quantity' in columns else 100.0
+        except ValueError:
+            grams = None
+        meal_type = (record.get(columns['meal']) or '').strip().lower() if 'meal' in columns else ''
+
+        if logged_at is None or not food_name or not grams or grams <= 0:
+            stats['skipped'] += 1
+            continue
+        parsed.append((logged_at, food_name, grams, meal_type if meal_type in MEAL_TYPES else 'snack'))
+
+        if len(parsed) >= chunk_size:
+            _insert_chunk(user_id, parsed, catalog, stats, name_cache)
+            parsed = []
+            yield dict(stats)
+
+    if parsed:
+        _insert_chunk(user_id, parsed, catalog, stats, name_cache)
+    stats['done'] = True
+    yield stats
@@ -0,0 +1,92 @@
+"""Per-user favorites as a bitmap over the in-memory catalog's rows.
+
+Bit i of a user's bitmap is set when catalog row i (catalog.ids[i]) is a
+favorite. A bitmap is built from one query on first use and then updated
+in place on toggle, so rendering favorites and flagging search results
+never touch the database.
+
+Bitmaps are cached per process in a UserCache, so a toggle makes other
+workers reload the user's bitmap on their next request.
+"""
+import time
+from sqlalchemy.dialects import postgresql, sqlite
+from model import db, FavoriteFood
+from catalog import get_catalog
+from user_cache import MISSING, UserCache
+
+_bitmaps = UserCache('_favorites_changed')  # user_id -> bitmap, per catalog version
+
+_UPSERT_DIALECTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def get_favorites(user_id, catalog=None):
+    """The user's favorites bitmap (an int) over `catalog` rows"""
+    catalog = catalog or get_catalog()
+    bitmap = _bitmaps.get(user_id, catalog.version)
+    if bitmap is not MISSING:
+        return bitmap
+
+    started = time.time()
+    bitmap = 0
+    food_ids = [fid for (fid,) in db.session.query(FavoriteFood.food_id).filter_by(user_id=user_id)]
+    for row in catalog.rows_for(food_ids):
+        bitmap |= 1 << int(row)
+    _bitmaps.put(user_id, bitmap, catalog.version, since=started)
+    return bitmap
+
+
+def iter_rows(bitmap):
+    """Set bits of `bitmap`, lowest row first"""
+    while bitmap:
+        low = bitmap & -bitmap
+        yield low.bit_length() - 1
+        bitmap ^= low
+
+
+def is_favorite(bitmap, food_id, catalog):
+    row = catalog.row_of.get(food_id)
+    return row is not None and bool(bitmap >> row & 1)
+
+
+def favorite_ids(user_id):
+    catalog = get_catalog()
+    return [int(catalog.ids[row]) for row in iter_rows(get_favorites(user_id, catalog))]
+
+
+def favorite_foods(user_id, limit=None):
+    """[{'id', 'name'}] for the user's favorites, in catalog order"""
+    catalog = get_catalog()
+    foods = []
+    for row in iter_rows(get_favorites(user_id, catalog)):
+        if limit is not None and len(foods) >= limit:
+            break
+        foods.append({'id': int(catalog.ids[row]), 'name': catalog.names[row]})
+    return foods
+
+
+def set_favorite(user_id, food_id, favorite):
+    """Idempotently add (upsert) or remove a favorite and update the cached bitmap.
+
+    Returns False if the food isn't in the catalog.
+    """
+    catalog = get_catalog()
+    row = catalog.row_of.get(food_id)
+    if row is None:
+        return False
+
+    if favorite:
+        insert = _UPSERT_DIALECTS.get(db.engine.dialect.name)
+        if insert is not None:
+            db.session.execute(insert(FavoriteFood.__table__).values(user_id=user_id, food_id=food_id)
+                               .on_conflict_do_nothing(index_elements=['user_id', 'food_id']))
+        elif not FavoriteFood.query.filter_by(user_id=user_id, food_id=food_id).first():
+            db.session.add(FavoriteFood(user_id=user_id, food_id=food_id))
+    else:
+        FavoriteFood.query.filter_by(user_id=user_id, food_id=food_id).delete(synchronize_session=False)
+    db.session.commit()
+
+    # Flip the bit on the cached bitmap under the cache lock, so concurrent
+    # toggles don't overwrite each other; uncached users reload on next read
+    bit = 1 << row
+    _bitmaps.changed(user_id, (lambda b: b | bit) if favorite else (lambda b: b & ~bit), catalog.version)
+    return True
@@ -0,0 +1,27 @@
+import argparse
+from app import app
+from model import User
+from diary_import import import_diary
+
+parser = argparse.ArgumentParser(description='Import a food diary CSV for a user')
+parser.add_argument('email', help='Email of the user to import into')
+parser.add_argument('csv_path')
+parser.add_argument('--chunk-size', type=int, default=None)
+args = parser.parse_args()
+
+with app.app_context():
+    user = User.query.filter_by(email=args.email.strip().lower()).first()
+    if not user:
+        raise SystemExit(f"❌ No user with email {args.email}")
+    
+    chunk_size = args.chunk_size or app.config['IMPORT_CHUNK_SIZE']
+    with open(args.csv_path, encoding='utf-8-sig', errors='replace', newline='') as f:
+        for progress in import_diary(user.id, f, chunk_size=chunk_size):
+            if progress.get('error'):
+                raise SystemExit(f"❌ {progress['error']}")
+            print(f"  ... {progress['rows']} rows read, {progress['imported']} imported")
+    
+    print(f"✅ Imported {progress['imported']} of {progress['rows']} rows "
+          f"({progress['skipped']} invalid, {progress['unmatched']} unmatched foods)")
+    if progress['unmatched_names']:
+        print("Unmatched foods: " + ", ".join(progress['unmatched_names']))
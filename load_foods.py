@@ -6,12 +6,7 @@ with app.app_context():
     db.create_all()
     print("✓ Database tables created/verified")
     
-    # Clear existing foods
-    Food.query.delete()
-    db.session.commit()
-    print("✓ Cleared existing foods")
-    
-    # Load from CSV
+    # Load from CSV (replaces existing foods and their servings)
     count, error = load_nutrition_data('data/nutrition_data_converted.csv')
     
     if error:
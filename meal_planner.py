@@ -0,0 +1,215 @@
+import threading
+import time
+import zlib
+from collections import OrderedDict
+import numpy as np
+from catalog import CATALOG_FIELDS, MACRO_COLS, fit_portions, get_catalog
+
+# Share of the day's targets per meal, and how many foods go into each
+MEAL_SPLIT = {'breakfast': 0.25, 'lunch': 0.35, 'dinner': 0.30, 'snack': 0.10}
+ITEMS_PER_MEAL = {'breakfast': 2, 'lunch': 3, 'dinner': 3, 'snack': 1}
+
+MIN_GRAMS = 30
+MAX_GRAMS = 350
+GRAM_STEP = 10
+
+# Columns of the catalog matrix the optimizer tracks
+PLAN_FIELDS = ('calories', 'protein', 'carbs', 'fat', 'sodium_mg', 'cholesterol_mg')
+_PLAN_COLS = [CATALOG_FIELDS.index(f) for f in PLAN_FIELDS]
+LIMIT_PENALTY = 10.0
+# Weight of each meal's calorie deviation from its MEAL_SPLIT share
+SLOT_WEIGHT = 0.5
+_SLOTS = tuple(MEAL_SPLIT)
+
+_plan_cache = OrderedDict()
+_plan_cache_lock = threading.Lock()
+
+
+def _candidate_rows(catalog, targets, limits, diet_preference, max_candidates):
+    """Prune the catalog to foods whose macro split is close to the target split"""
+    kcal = catalog.matrix[:, 0]
+    usable = catalog.diet_mask(diet_preference) & (kcal > 5) & ~catalog.is_condiment
+
+    # Drop foods (pickles, masalas, chutneys) so salty that any useful
+    # portion would blow the sodium budget on its own
+    sodium = catalog.matrix[:, CATALOG_FIELDS.index('sodium_mg')]
+    usable &= sodium / np.maximum(kcal, 1e-9) <= 3 * limits[0] / targets[0]
+    rows = np.flatnonzero(usable)
+    if len(rows) <= max_candidates:
+        return rows
+
+    # Energy share of protein/carbs/fat, per food and for the targets
+    energy = catalog.matrix[rows, 1:4] * np.array([4.0, 4.0, 9.0])
+    share = energy / np.maximum(energy.sum(axis=1, keepdims=True), 1e-9)
+    t = targets[1:4] * np.array([4.0, 4.0, 9.0])
+    t_share = t / max(t.sum(), 1e-9)
+    dist = np.abs(share - t_share).sum(axis=1)
+
+    # Keep the closest splits, plus the most protein-dense foods so the
+    # local search can still correct a protein shortfall
+    n_close = max_candidates * 3 // 4
+    close = rows[np.argsort(dist)[:n_close]]
+    protein_density = catalog.matrix[rows, 1] / kcal[rows]
+    dense = rows[np.argsort(-protein_density)[:max_candidates - n_close]]
+    return np.unique(np.concatenate([close, dense]))
+
+
+class _Plan:
+    """Mutable plan state: one (slot, row, grams) per item plus running totals"""
+
+    def __init__(self, nutrients, targets, limits):
+        self.nutrients = nutrients             # (n, 6) per gram for candidate rows
+        self.targets = targets
+        self.limits = limits
+        self.slots = []
+        self.rows = []
+        self.grams = []
+        self.totals = np.zeros(len(PLAN_FIELDS))
+        self.slot_targets = targets[0] * np.array([MEAL_SPLIT[s] for s in _SLOTS])
+        self.slot_kcal = np.zeros(len(_SLOTS))
+
+    def add(self, slot, row, grams):
+        self.slots.append(slot)
+        self.rows.append(row)
+        self.grams.append(grams)
+        self.totals += self.nutrients[row] * grams
+        self.slot_kcal[_SLOTS.index(slot)] += self.nutrients[row, 0] * grams
+
+    def excess(self, totals=None):
+        totals = self.totals if totals is None else totals
+        return float((np.maximum(totals[4:] - self.limits, 0.0) / self.limits).sum())
+
+    def cost(self, totals=None, slot_kcal=None):
+        totals = self.totals if totals is None else totals
+        slot_kcal = self.slot_kcal if slot_kcal is None else slot_kcal
+        dev = (totals[:4] - self.targets) / self.targets
+        slot_dev = (slot_kcal - self.slot_targets) / self.slot_targets
+        excess = np.maximum(totals[4:] - self.limits, 0.0) / self.limits
+        return float(dev @ dev + SLOT_WEIGHT * (slot_dev @ slot_dev) + LIMIT_PENALTY * (excess @ excess))
+
+
+def _greedy(plan, candidates_per_g, targets):
+    used = set()
+    for slot, share in MEAL_SPLIT.items():
+        slot_remaining = targets * share
+        n_items = ITEMS_PER_MEAL[slot]
+        for k in range(n_items):
+            want = np.maximum(slot_remaining / (n_items - k), 0.0)
+            if want[0] <= 0:
+                break
+            grams, score = fit_portions(candidates_per_g[:, MACRO_COLS], want, MIN_GRAMS, MAX_GRAMS, scale=targets)
+            if used:
+                score[list(used)] = np.inf
+            best = int(np.argmin(score))
+            if not np.isfinite(score[best]):
+                break
+            g = float(round(grams[best] / GRAM_STEP) * GRAM_STEP)
+            plan.add(slot, best, g)
+            used.add(best)
+            slot_remaining = slot_remaining - candidates_per_g[best, MACRO_COLS] * g
+
+
+def _local_search(plan, rng, deadline):
+    """First-improvement search over portion tweaks and food swaps until the deadline"""
+    n_rows = len(plan.nutrients)
+    cost = plan.cost()
+    iterations = 0
+    while plan.rows and time.perf_counter() < deadline:
+        iterations += 1
+        i = int(rng.integers(len(plan.rows)))
+        row, grams = plan.rows[i], plan.grams[i]
+
+        if rng.random() < 0.6:
+            # Nudge the portion size
+            new_row = row
+            new_grams = grams + GRAM_STEP * int(rng.choice((-3, -2, -1, 1, 2, 3)))
+            new_grams = min(max(new_grams, MIN_GRAMS), MAX_GRAMS)
+        else:
+            # Swap in another food at roughly the same energy
+            new_row = int(rng.integers(n_rows))
+            if new_row in plan.rows:
+                continue
+            kcal_old = plan.nutrients[row, 0] * grams
+            kcal_new = plan.nutrients[new_row, 0]
+            new_grams = kcal_old / kcal_new if kcal_new > 0 else MAX_GRAMS
+            new_grams = min(max(round(new_grams / GRAM_STEP) * GRAM_STEP, MIN_GRAMS), MAX_GRAMS)
+
+        if new_row == row and new_grams == grams:
+            continue
+        totals = plan.totals - plan.nutrients[row] * grams + plan.nutrients[new_row] * new_grams
+        slot_kcal = plan.slot_kcal.copy()
+        slot_kcal[_SLOTS.index(plan.slots[i])] += totals[0] - plan.totals[0]
+        # Limits are hard once met: never accept a move that breaks them
+        new_excess = plan.excess(totals)
+        if new_excess > 0 and new_excess >= plan.excess():
+            continue
+        new_cost = plan.cost(totals, slot_kcal)
+        if new_cost < cost:
+            plan.rows[i], plan.grams[i], plan.totals, cost = new_row, float(new_grams), totals, new_cost
+            plan.slot_kcal = slot_kcal
+    return iterations
+
+
+def generate_meal_plan(targets, diet_preference=None, sodium_limit_mg=2300, cholesterol_limit_mg=300,
+                       time_budget_ms=150, max_candidates=150, use_cache=True):
+    """Build a full-day plan hitting calorie/macro targets within sodium and cholesterol limits.
+
+    `targets` is a dict with calories/protein/carbs/fat. Foods are pruned to
+    the best-matching candidates, each meal is filled greedily with the best
+    single-portion fits, and the day is then refined by local search until
+    the time budget runs out. Plans are cached per target profile and
+    catalog version.
+    """
+    catalog = get_catalog()
+    t = np.array([max(float(targets.get(k, 0) or 0), 1.0) for k in CATALOG_FIELDS[MACRO_COLS]])
+    limits = np.array([float(sodium_limit_mg), float(cholesterol_limit_mg)])
+
+    key = (catalog.version, tuple(int(v) for v in t), diet_preference, tuple(limits))
+    if use_cache:
+        with _plan_cache_lock:
+            if key in _plan_cache:
+                _plan_cache.move_to_end(key)
+                return _plan_cache[key]
+
+    started = time.perf_counter()
+    rows = _candidate_rows(catalog, t, limits, diet_preference, max_candidates)
+    per_g = catalog.matrix[rows][:, _PLAN_COLS] / 100.0
+
+    plan = _Plan(per_g, t, limits)
+    if len(rows):
+        _greedy(plan, per_g, t)
+        rng = np.random.default_rng(zlib.crc32(repr(key).encode()))
+        iterations = _local_search(plan, rng, started + time_budget_ms / 1000.0)
+    else:
+        iterations = 0
+
+    meals = {slot: [] for slot in MEAL_SPLIT}
+    for slot, row, grams in zip(plan.slots, plan.rows, plan.grams):
+        i = rows[row]
+        amounts = plan.nutrients[row] * grams
+        meals[slot].append({
+            'id': int(catalog.ids[i]),
+            'name': catalog.names[i],
+            'grams': grams,
+            'calories': round(float(amounts[0]), 1),
+            'protein': round(float(amounts[1]), 1),
+            'carbs': round(float(amounts[2]), 1),
+            'fat': round(float(amounts[3]), 1)
+        })
+
+    result = {
+        'meals': meals,
+        'totals': {f: round(float(v), 1) for f, v in zip(PLAN_FIELDS, plan.totals)},
+        'targets': dict(zip(CATALOG_FIELDS[MACRO_COLS], (int(v) for v in t))),
+        'within_limits': bool(np.all(plan.totals[4:] <= limits)),
+        'candidates': int(len(rows)),
+        'iterations': iterations,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+    if use_cache:
+        with _plan_cache_lock:
+            _plan_cache[key] = result
+            while len(_plan_cache) > 256:
+                _plan_cache.popitem(last=False)
+    return result
@@ -1,9 +1,76 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, date
+import numpy as np
+from db_routing import RoutingSession
+from auth import hash_password, verify_password
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Fixed order of the packed per-100g nutrient vector (Food.nutrients).
+# Append only: stored blobs are decoded positionally.
+NUTRIENT_FIELDS = (
+    'energy_kj', 'energy_kcal', 'carb_g', 'protein_g', 'fat_g', 'freesugar_g', 'fibre_g',
+    'sfa_mg', 'mufa_mg', 'pufa_mg', 'cholesterol_mg', 'calcium_mg', 'phosphorus_mg',
+    'magnesium_mg', 'sodium_mg', 'potassium_mg', 'iron_mg', 'copper_mg', 'selenium_ug',
+    'chromium_mg', 'manganese_mg', 'molybdenum_mg', 'zinc_mg', 'vita_ug', 'vite_mg',
+    'vitd2_ug', 'vitd3_ug', 'vitk1_ug', 'vitk2_ug', 'folate_ug', 'vitb1_mg', 'vitb2_mg',
+    'vitb3_mg', 'vitb5_mg', 'vitb6_mg', 'vitb7_ug', 'vitb9_ug', 'vitc_mg', 'carotenoids_ug'
+)
+NUTRIENT_DTYPE = np.dtype('<f4')
+
+def pack_nutrients(values):
+    """Pack a mapping of nutrient -> value into the fixed-order float32 blob"""
+    vec = np.zeros(len(NUTRIENT_FIELDS), dtype=NUTRIENT_DTYPE)
+    for i, field in enumerate(NUTRIENT_FIELDS):
+        try:
+            v = float(values.get(field, 0) or 0)
+        except (TypeError, ValueError):
+            continue
+        vec[i] = v if v == v else 0.0
+    return vec.tobytes()
+
+def unpack_nutrients(blob):
+    """Zero-copy read-only float32 view over a packed blob"""
+    vec = np.frombuffer(blob, dtype=NUTRIENT_DTYPE)
+    return vec[:len(NUTRIENT_FIELDS)]
+
+# Mifflin-St Jeor target formula parameters, shared by User.calculate_targets
+# and the bulk recomputation in calculate_targets_bulk / recompute_targets.py
+ACTIVITY_MULTIPLIERS = {'sedentary': 1.2, 'light': 1.375, 'moderate': 1.55, 'active': 1.725, 'very_active': 1.9}
+GOAL_CALORIE_ADJUSTMENTS = {'loss': -500, 'gain': 300}
+MACRO_SPLIT = {'protein': 0.30, 'carbs': 0.40, 'fat': 0.30}
+CALORIES_PER_GRAM = {'protein': 4, 'carbs': 4, 'fat': 9}
+
+def calculate_targets_bulk(age, gender, weight, height, activity_level, goal):
+    """Vectorized User.calculate_targets over equal-length sequences.
+
+    Returns (valid, calories, protein, carbs, fat): `valid` marks rows with a
+    complete profile (others should be left untouched), the rest are int64
+    arrays matching the scalar method exactly.
+    """
+    n = len(age)
+    valid = np.array([all(v) for v in zip(age, gender, weight, height, activity_level, goal)], dtype=bool)
+    age = np.array([a or 0 for a in age], dtype=np.float64)
+    weight = np.array([w or 0 for w in weight], dtype=np.float64)
+    height = np.array([h or 0 for h in height], dtype=np.float64)
+    is_male = np.array([g == 'male' for g in gender], dtype=bool)
+    multiplier = np.fromiter((ACTIVITY_MULTIPLIERS.get(a, 1.2) for a in activity_level), dtype=np.float64, count=n)
+    adjustment = np.fromiter((GOAL_CALORIE_ADJUSTMENTS.get(g, 0) for g in goal), dtype=np.float64, count=n)
+    
+    bmr = (10 * weight) + (6.25 * height) - (5 * age) + np.where(is_male, 5, -161)
+    target_calories = bmr * multiplier + adjustment
+    
+    def to_int(values):
+        return np.trunc(values).astype(np.int64)
+    
+    return (
+        valid,
+        to_int(target_calories),
+        to_int((target_calories * MACRO_SPLIT['protein']) / CALORIES_PER_GRAM['protein']),
+        to_int((target_calories * MACRO_SPLIT['carbs']) / CALORIES_PER_GRAM['carbs']),
+        to_int((target_calories * MACRO_SPLIT['fat']) / CALORIES_PER_GRAM['fat'])
+    )
 
 class User(UserMixin, db.Model):
     """User account model with authentication and profile data"""
@@ -21,6 +88,7 @@ class User(UserMixin, db.Model):
     height = db.Column(db.Float)  # cm
     activity_level = db.Column(db.String(20))  # sedentary/light/moderate/active/very_active
     goal = db.Column(db.String(20))  # loss/gain/maintain/recomp
+    diet_preference = db.Column(db.String(20))  # vegetarian/eggetarian/non_vegetarian
     
     # Calculated fields
     daily_calorie_target = db.Column(db.Integer, default=2000)
@@ -47,10 +115,11 @@ class User(UserMixin, db.Model):
     meal_templates = db.relationship('MealTemplate', backref='user', lazy='dynamic', cascade='all, delete-orphan')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        # Runs on the bounded hashing pool; may raise auth.HashingBusy
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
     
     def calculate_targets(self):
         if not all([self.age, self.gender, self.weight, self.height, self.activity_level, self.goal]):
@@ -60,17 +129,13 @@ class User(UserMixin, db.Model):
         else:
             bmr = (10 * self.weight) + (6.25 * self.height) - (5 * self.age) - 161
         
-        activity_multipliers = {'sedentary': 1.2, 'light': 1.375, 'moderate': 1.55, 'active': 1.725, 'very_active': 1.9}
-        tdee = bmr * activity_multipliers.get(self.activity_level, 1.2)
-        
-        if self.goal == 'loss': target_calories = tdee - 500
-        elif self.goal == 'gain': target_calories = tdee + 300
-        else: target_calories = tdee
+        tdee = bmr * ACTIVITY_MULTIPLIERS.get(self.activity_level, 1.2)
+        target_calories = tdee + GOAL_CALORIE_ADJUSTMENTS.get(self.goal, 0)
         
         self.daily_calorie_target = int(target_calories)
-        self.protein_target = int((target_calories * 0.30) / 4)
-        self.carbs_target = int((target_calories * 0.40) / 4)
-        self.fat_target = int((target_calories * 0.30) / 9)
+        self.protein_target = int((target_calories * MACRO_SPLIT['protein']) / CALORIES_PER_GRAM['protein'])
+        self.carbs_target = int((target_calories * MACRO_SPLIT['carbs']) / CALORIES_PER_GRAM['carbs'])
+        self.fat_target = int((target_calories * MACRO_SPLIT['fat']) / CALORIES_PER_GRAM['fat'])
     
     def get_bmi(self):
         if self.weight and self.height:
@@ -110,6 +175,46 @@ class Food(db.Model):
     iron_mg = db.Column(db.Float, default=0.0)
     
     category = db.Column(db.String(50))
+    
+    # Full per-100g profile as a packed float32 vector (see NUTRIENT_FIELDS).
+    # Deferred so regular food queries don't pay for it.
+    nutrients = db.deferred(db.Column(db.LargeBinary))
+    
+    @property
+    def nutrient_vector(self):
+        if not self.nutrients:
+            return None
+        return unpack_nutrients(self.nutrients)
+    
+    def nutrient_profile(self):
+        vec = self.nutrient_vector
+        if vec is None:
+            return {}
+        return {field: round(float(v), 2) for field, v in zip(NUTRIENT_FIELDS, vec)}
+
+class FoodServing(db.Model):
+    """Food-specific serving unit (bowl, plate, piece...) with exact per-serving nutrients"""
+    __tablename__ = 'food_servings'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    food_id = db.Column(db.Integer, db.ForeignKey('foods.id'), nullable=False)
+    food = db.relationship('Food', backref=db.backref('servings', lazy='dynamic', cascade='all, delete-orphan'))
+    unit = db.Column(db.String(50), nullable=False)
+    grams = db.Column(db.Float, nullable=False)  # derived weight of one serving
+    
+    # Per-serving values straight from the CSV's unit_serving_* columns
+    calories = db.Column(db.Float, nullable=False)
+    protein = db.Column(db.Float, nullable=False)
+    carbs = db.Column(db.Float, nullable=False)
+    fat = db.Column(db.Float, nullable=False)
+    cholesterol_mg = db.Column(db.Float, default=0.0)
+    sodium_mg = db.Column(db.Float, default=0.0)
+    fibre_g = db.Column(db.Float, default=0.0)
+    vitc_mg = db.Column(db.Float, default=0.0)
+    vita_ug = db.Column(db.Float, default=0.0)
+    iron_mg = db.Column(db.Float, default=0.0)
+    
+    __table_args__ = (db.UniqueConstraint('food_id', 'unit', name='unique_food_unit'),)
 
 class FoodLog(db.Model):
     """Daily food intake logs with cached advanced nutrition"""
@@ -154,9 +259,68 @@ class FoodLog(db.Model):
             self.vitc_mg = round((self.food.vitc_mg or 0) * m, 1)
             self.vita_ug = round((self.food.vita_ug or 0) * m, 1)
             self.iron_mg = round((self.food.iron_mg or 0) * m, 1)
+    
+    def nutrient_vector(self):
+        """Full nutrient vector for this log's quantity, computed on demand"""
+        vec = self.food.nutrient_vector if self.food else None
+        if vec is None:
+            return None
+        return vec * np.float32(self.quantity / 100)
+    
+    def apply_serving(self, serving, count):
+        """Set quantity and cached nutrition from `count` food-specific servings"""
+        self.quantity = round(serving.grams * count, 1)
+        self.calories = round(serving.calories * count, 1)
+        self.protein = round(serving.protein * count, 1)
+        self.carbs = round(serving.carbs * count, 1)
+        self.fat = round(serving.fat * count, 1)
+        self.sodium_mg = round((serving.sodium_mg or 0) * count, 1)
+        self.cholesterol_mg = round((serving.cholesterol_mg or 0) * count, 1)
+        self.fibre_g = round((serving.fibre_g or 0) * count, 1)
+        self.vitc_mg = round((serving.vitc_mg or 0) * count, 1)
+        self.vita_ug = round((serving.vita_ug or 0) * count, 1)
+        self.iron_mg = round((serving.iron_mg or 0) * count, 1)
 # FavoriteFood, WeightLog, Recipe etc. classes follow...
 # (Keep them exactly as you had them in your original code)
 
+class FoodLogArchive(db.Model):
+    """Compact cold storage for FoodLog rows older than the retention horizon"""
+    __tablename__ = 'food_log_archive'
+    
+    id = db.Column(db.Integer, primary_key=True)  # original food_logs.id
+    user_id = db.Column(db.Integer, nullable=False)
+    food_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Float, nullable=False)
+    meal_type = db.Column(db.String(20), nullable=False)
+    logged_at = db.Column(db.DateTime, nullable=False)
+    calories = db.Column(db.Float)
+    protein = db.Column(db.Float)
+    carbs = db.Column(db.Float)
+    fat = db.Column(db.Float)
+    
+    __table_args__ = (db.Index('ix_food_log_archive_user_logged', 'user_id', 'logged_at'),)
+
+class DailyRollup(db.Model):
+    """Per-user per-day nutrition totals kept online for archived days"""
+    __tablename__ = 'daily_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    calories = db.Column(db.Float, default=0.0)
+    protein = db.Column(db.Float, default=0.0)
+    carbs = db.Column(db.Float, default=0.0)
+    fat = db.Column(db.Float, default=0.0)
+    cholesterol_mg = db.Column(db.Float, default=0.0)
+    sodium_mg = db.Column(db.Float, default=0.0)
+    fibre_g = db.Column(db.Float, default=0.0)
+    vitc_mg = db.Column(db.Float, default=0.0)
+    vita_ug = db.Column(db.Float, default=0.0)
+    iron_mg = db.Column(db.Float, default=0.0)
+    meal_count = db.Column(db.Integer, default=0)
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'day', name='unique_user_day'),)
+
 class FavoriteFood(db.Model):
     __tablename__ = 'favorite_foods'
     id = db.Column(db.Integer, primary_key=True)
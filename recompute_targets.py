@@ -0,0 +1,62 @@
+import argparse
+import time
+import numpy as np
+from sqlalchemy import bindparam, update
+from app import app
+from model import db, User, calculate_targets_bulk
+
+TARGET_COLUMNS = ('daily_calorie_target', 'protein_target', 'carbs_target', 'fat_target')
+
+parser = argparse.ArgumentParser(description="Recompute every user's calorie and macro targets")
+parser.add_argument('--chunk-size', type=int, default=10000)
+parser.add_argument('--dry-run', action='store_true', help='Report changes without writing them')
+parser.add_argument('--show', type=int, default=20, help='How many changed users to print')
+args = parser.parse_args()
+
+users_table = User.__table__
+update_stmt = update(users_table).where(users_table.c.id == bindparam('b_id')).values(
+    **{col: bindparam(f'b_{col}') for col in TARGET_COLUMNS})
+
+with app.app_context():
+    started = time.perf_counter()
+    scanned = changed = shown = 0
+    last_id = 0
+
+    print(f"{'DRY RUN: ' if args.dry_run else ''}Recomputing targets in chunks of {args.chunk_size}...")
+    while True:
+        rows = db.session.query(
+            User.id, User.age, User.gender, User.weight, User.height, User.activity_level, User.goal,
+            *[getattr(User, col) for col in TARGET_COLUMNS]
+        ).filter(User.id > last_id).order_by(User.id).limit(args.chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        scanned += len(rows)
+
+        ids, age, gender, weight, height, activity, goal, *current = zip(*rows)
+        valid, *targets = calculate_targets_bulk(age, gender, weight, height, activity, goal)
+
+        # Rows with a complete profile whose stored targets differ
+        current = np.array([[v if v is not None else -1 for v in col] for col in current], dtype=np.int64)
+        new = np.vstack(targets)
+        diff = valid & np.any(current != new, axis=0)
+        idx = np.flatnonzero(diff)
+        changed += len(idx)
+
+        for i in idx[:max(args.show - shown, 0)]:
+            old_values = ' / '.join(str(rows[i][7 + k]) for k in range(len(TARGET_COLUMNS)))
+            new_values = ' / '.join(str(int(new[k, i])) for k in range(len(TARGET_COLUMNS)))
+            print(f"  user {ids[i]}: {old_values} -> {new_values}")
+            shown += 1
+
+        if len(idx) and not args.dry_run:
+            db.session.execute(update_stmt, [
+                {'b_id': ids[i], **{f'b_{col}': int(new[k, i]) for k, col in enumerate(TARGET_COLUMNS)}}
+                for i in idx
+            ])
+            db.session.commit()
+
+    elapsed = time.perf_counter() - started
+    rate = scanned / elapsed if elapsed > 0 else 0
+    verb = 'would change' if args.dry_run else 'updated'
+    print(f"✅ Scanned {scanned} users, {verb} {changed} in {elapsed:.2f}s ({rate:,.0f} users/s)")
@@ -0,0 +1,35 @@
+"""Refresh a local SQLite stand-in for the read replica.
+
+    DATABASE_REPLICA_URL=sqlite:////path/to/replica.db python sync_replica.py
+
+Copies the primary SQLite database into the replica file with SQLite's
+online backup API, so it is safe while the app is running. Re-run it (or
+run it from cron) to simulate replication; anything written since the last
+sync is only visible on the primary, like real replication lag. Hosted
+PostgreSQL replicas are kept in sync by the provider instead.
+"""
+import sqlite3
+from app import app
+from db_routing import REPLICA_BIND
+from model import db
+
+with app.app_context():
+    if REPLICA_BIND not in db.engines:
+        raise SystemExit("❌ DATABASE_REPLICA_URL is not set")
+
+    primary_url = db.engines[None].url
+    replica_url = db.engines[REPLICA_BIND].url
+    if primary_url.get_backend_name() != 'sqlite' or replica_url.get_backend_name() != 'sqlite':
+        raise SystemExit("❌ sync_replica.py only copies SQLite databases")
+
+    print(f"Copying {primary_url.database} -> {replica_url.database}...")
+    src = sqlite3.connect(primary_url.database)
+    dst = sqlite3.connect(replica_url.database)
+    try:
+        with dst:
+            src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+    print("✅ Replica refreshed")
@@ -0,0 +1,78 @@
+"""Per-process, per-user caches that other workers can invalidate.
+
+Each cache is an LRU of at most `max_users` entries that expire after
+`ttl` seconds. A change stamps the user's Flask session under the cache's
+`changed_key`, so any worker holding an entry loaded before that stamp
+reloads it on the user's next request. The TTL covers changes made from
+another device (another session).
+"""
+import threading
+import time
+from collections import OrderedDict
+from flask import has_request_context, session
+
+# Returned by UserCache.get on a miss (cached values may be None)
+MISSING = object()
+
+
+class UserCache:
+    def __init__(self, changed_key, max_users=10000, ttl=300):
+        self.changed_key = changed_key
+        self.max_users = max_users
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (version, loaded_at, value)
+        self._lock = threading.Lock()
+
+    def _changed_at(self):
+        return session.get(self.changed_key, 0) if has_request_context() else 0
+
+    def _set(self, user_id, version, loaded_at, value):
+        self._entries[user_id] = (version, loaded_at, value)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+
+    def get(self, user_id, version=None):
+        """The cached value, or MISSING if absent, expired, stale or from another `version`"""
+        changed_at = self._changed_at()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return MISSING
+            entry_version, loaded_at, value = entry
+            if entry_version != version or loaded_at < changed_at or time.time() - loaded_at >= self.ttl:
+                return MISSING
+            self._entries.move_to_end(user_id)
+            return value
+
+    def put(self, user_id, value, version=None, since=None):
+        """Cache a freshly loaded value.
+
+        `since` is when the load started (time.time()); the value is dropped
+        if the user's data changed after that, so a slow load can't overwrite
+        a newer entry.
+        """
+        loaded_at = time.time() if since is None else since
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > loaded_at:
+                return
+            self._set(user_id, version, loaded_at, value)
+
+    def changed(self, user_id, update=None, version=None):
+        """Record a committed change to the user's data.
+
+        Stamps the session, then either applies `update(value)` to this
+        worker's entry under the lock (when it is cached and current) or
+        marks the entry stale.
+        """
+        if has_request_context():
+            session[self.changed_key] = time.time()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            now = time.time()
+            if (update is not None and entry is not None and entry[0] == version
+                    and entry[2] is not MISSING and now - entry[1] < self.ttl):
+                self._set(user_id, version, now, update(entry[2]))
+            else:
+                self._set(user_id, None, now, MISSING)
@@ -1,8 +1,12 @@
 import pandas as pd
 import os
 from datetime import datetime, timedelta, date
-from model import db, Food, FoodLog
-from sqlalchemy import func
+import numpy as np
+from model import (db, Food, FoodLog, FoodServing, FoodLogArchive, DailyRollup,
+                   NUTRIENT_FIELDS, NUTRIENT_DTYPE, pack_nutrients)
+from catalog import invalidate_catalog
+from db_routing import replica_reads
+from sqlalchemy import func, inspect, text
 
 def load_nutrition_data(csv_path):
     """CSV Loader - Specific for your nutrition_data.csv"""
@@ -16,9 +20,11 @@ def load_nutrition_data(csv_path):
         df.columns = df.columns.str.strip() # Remove spaces from headers
 
         # Clear old data
+        FoodServing.query.delete()
         Food.query.delete()
         
         foods = []
+        serving_rows = []
         for _, row in df.iterrows():
             try:
                 name = str(row.get('food_name', '')).strip()
@@ -37,22 +43,157 @@ def load_nutrition_data(csv_path):
                     vitc_mg=float(row.get('vitc_mg', 0)),
                     vita_ug=float(row.get('vita_ug', 0)),
                     iron_mg=float(row.get('iron_mg', 0)),
-                    category='General'
+                    category='General',
+                    nutrients=pack_nutrients(row)
                 )
                 foods.append(food)
+                serving_rows.append(row)
             except:
                 continue
 
-        db.session.bulk_save_objects(foods)
+        # Flush to get food ids for the serving rows
+        db.session.add_all(foods)
+        db.session.flush()
+        
+        servings = []
+        for food, row in zip(foods, serving_rows):
+            serving = build_food_serving(food, row)
+            if serving is not None:
+                servings.append(serving)
+        
+        db.session.bulk_save_objects(servings)
         db.session.commit()
-        print(f"✅ Loaded {len(foods)} foods successfully!")
+        invalidate_catalog()
+        print(f"✅ Loaded {len(foods)} foods ({len(servings)} serving units) successfully!")
         return len(foods), None
         
     except Exception as e:
         db.session.rollback()
         return 0, str(e)
 
-def get_daily_summary(user_id, target_date=None):
+def build_food_serving(food, row):
+    """FoodServing from a CSV row's servings_unit/unit_serving_* columns, or None"""
+    unit = str(row.get('servings_unit', '')).strip().lower()
+    if not unit or unit == 'nan' or unit in ('g', 'ml'):
+        return None
+    
+    try:
+        per_serving = {
+            'calories': float(row.get('unit_serving_energy_kcal')),
+            'protein': float(row.get('unit_serving_protein_g')),
+            'carbs': float(row.get('unit_serving_carb_g')),
+            'fat': float(row.get('unit_serving_fat_g')),
+            'cholesterol_mg': float(row.get('unit_serving_cholesterol_mg', 0)),
+            'sodium_mg': float(row.get('unit_serving_sodium_mg', 0)),
+            'fibre_g': float(row.get('unit_serving_fibre_g', 0)),
+            'vitc_mg': float(row.get('unit_serving_vitc_mg', 0)),
+            'vita_ug': float(row.get('unit_serving_vita_ug', 0)),
+            'iron_mg': float(row.get('unit_serving_iron_mg', 0))
+        }
+    except (TypeError, ValueError):
+        return None
+    if any(per_serving[k] != per_serving[k] for k in ('calories', 'protein', 'carbs', 'fat')):
+        return None
+    per_serving = {k: (0.0 if v != v else v) for k, v in per_serving.items()}
+    
+    # Serving weight = ratio of per-serving to per-100g values; energy is the
+    # most reliable column, fall back to the macros for zero-calorie foods
+    grams = None
+    for per_100g, serving_value in ((food.calories, per_serving['calories']),
+                                    (food.carbs, per_serving['carbs']),
+                                    (food.protein, per_serving['protein']),
+                                    (food.fat, per_serving['fat'])):
+        if per_100g and per_100g > 0:
+            grams = round(serving_value / per_100g * 100, 1)
+            break
+    if not grams:
+        return None
+    
+    return FoodServing(food_id=food.id, unit=unit[:50], grams=grams, **per_serving)
+
+# Columns added to tables that predate them. db.create_all() only creates
+# missing tables, so upgrade_schema() adds these to existing databases.
+SCHEMA_UPGRADES = (('foods', 'nutrients'), ('users', 'diet_preference'))
+
+def upgrade_schema():
+    """Idempotently add SCHEMA_UPGRADES columns; returns the ones added"""
+    added = []
+    for table_name, column_name in SCHEMA_UPGRADES:
+        existing = {c['name'] for c in inspect(db.engine).get_columns(table_name)}
+        if column_name in existing:
+            continue
+        column = db.metadata.tables[table_name].c[column_name]
+        column_type = column.type.compile(dialect=db.engine.dialect)
+        with db.engine.begin() as conn:
+            conn.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}'))
+        added.append(f'{table_name}.{column_name}')
+    return added
+
+def backfill_food_nutrients(csv_path):
+    """Pack Food.nutrients (and add serving units) for foods loaded before they existed.
+
+    Foods are matched to CSV rows by name; foods not in the CSV (e.g. the
+    sample foods) get a vector built from their own columns.
+    """
+    missing = Food.query.filter(Food.nutrients.is_(None)).all()
+    if not missing:
+        return 0
+    
+    rows = {}
+    if os.path.exists(csv_path):
+        df = pd.read_csv(csv_path, encoding='latin-1')
+        df.columns = df.columns.str.strip()
+        for _, row in df.iterrows():
+            rows.setdefault(str(row.get('food_name', '')).strip(), row)
+    with_servings = {fid for (fid,) in db.session.query(FoodServing.food_id).distinct()}
+    
+    for food in missing:
+        row = rows.get(food.name)
+        if row is None:
+            row = {'energy_kcal': food.calories, 'protein_g': food.protein, 'carb_g': food.carbs,
+                   'fat_g': food.fat, 'cholesterol_mg': food.cholesterol_mg, 'sodium_mg': food.sodium_mg,
+                   'fibre_g': food.fibre_g, 'vitc_mg': food.vitc_mg, 'vita_ug': food.vita_ug,
+                   'iron_mg': food.iron_mg}
+        elif food.id not in with_servings:
+            serving = build_food_serving(food, row)
+            if serving is not None:
+                db.session.add(serving)
+        food.nutrients = pack_nutrients(row)
+    
+    db.session.commit()
+    invalidate_catalog()
+    return len(missing)
+
+def get_food_units(food_ids):
+    """Map food_id -> list of valid units ({'unit', 'grams'}) in one query"""
+    units = {fid: [{'unit': 'g', 'grams': 1.0}, {'unit': 'ml', 'grams': 1.0}] for fid in food_ids}
+    if not food_ids:
+        return units
+    rows = db.session.query(FoodServing.food_id, FoodServing.unit, FoodServing.grams).filter(
+        FoodServing.food_id.in_(food_ids)).all()
+    for food_id, unit, grams in rows:
+        units[food_id].insert(0, {'unit': unit, 'grams': grams})
+    return units
+
+# Cached per-log nutrition fields that are summed into daily totals / rollups
+SUMMARY_FIELDS = ('calories', 'protein', 'carbs', 'fat', 'sodium_mg', 'cholesterol_mg',
+                  'fibre_g', 'vitc_mg', 'vita_ug', 'iron_mg')
+
+def archive_watermark(user_id):
+    """Newest day with archived logs for this user (None if nothing is archived).
+
+    Derived from the rollups archive_old_logs actually wrote, so reads stay
+    correct whatever retention a given archive run used.
+    """
+    return db.session.query(func.max(DailyRollup.day)).filter(DailyRollup.user_id == user_id).scalar()
+
+@replica_reads()
+def get_daily_summary(user_id, target_date=None, rollups=None):
+    """Totals for one day, live logs plus any archived rollup.
+
+    `rollups` ({day: DailyRollup}) is an already-fetched set of this user's
+    rollups covering target_date, for callers summarising several days.
+    """
     if target_date is None: target_date = date.today()
     start = datetime.combine(target_date, datetime.min.time())
     end = datetime.combine(target_date, datetime.max.time())
@@ -60,23 +201,101 @@ def get_daily_summary(user_id, target_date=None):
     logs = FoodLog.query.filter(FoodLog.user_id == user_id, 
                                FoodLog.logged_at.between(start, end)).all()
     
-    if not logs:
+    summary = {field: sum(getattr(l, field) or 0 for l in logs) for field in SUMMARY_FIELDS}
+    summary['meal_count'] = len(logs)
+    
+    # Archived days only have their rollup online (archiving only ever
+    # covers past days, so today never needs the lookup)
+    if rollups is not None:
+        rollup = rollups.get(target_date)
+    elif target_date < date.today():
+        rollup = DailyRollup.query.filter_by(user_id=user_id, day=target_date).first()
+    else:
+        rollup = None
+    if rollup:
+        for field in SUMMARY_FIELDS:
+            summary[field] += getattr(rollup, field) or 0
+        summary['meal_count'] += rollup.meal_count or 0
+    
+    if not summary['meal_count']:
         return {'calories': 0, 'protein': 0, 'carbs': 0, 'fat': 0, 'meal_count': 0,
                 'cholesterol_mg': 0, 'sodium_mg': 0, 'fibre_g': 0, 'vitc_mg': 0, 'vita_ug': 0, 'iron_mg': 0}
 
-    return {
-        'calories': round(sum(l.calories or 0 for l in logs), 1),
-        'protein': round(sum(l.protein or 0 for l in logs), 1),
-        'carbs': round(sum(l.carbs or 0 for l in logs), 1),
-        'fat': round(sum(l.fat or 0 for l in logs), 1),
-        'sodium_mg': round(sum(l.sodium_mg or 0 for l in logs), 1),
-        'cholesterol_mg': round(sum(l.cholesterol_mg or 0 for l in logs), 1),
-        'fibre_g': round(sum(l.fibre_g or 0 for l in logs), 1),
-        'vitc_mg': round(sum(l.vitc_mg or 0 for l in logs), 1),
-        'vita_ug': round(sum(l.vita_ug or 0 for l in logs), 1),
-        'iron_mg': round(sum(l.iron_mg or 0 for l in logs), 1),
-        'meal_count': len(logs)
-    }
+    return {field: (round(v, 1) if field != 'meal_count' else v) for field, v in summary.items()}
+
+def archive_old_logs(retention_days, batch_size=5000, progress=None):
+    """Move FoodLog rows older than `retention_days` into food_log_archive.
+
+    Works in primary-key batches, one transaction each: the batch is folded
+    into DailyRollup totals, copied to the archive and deleted from
+    food_logs. Safe to re-run; returns the number of rows archived.
+    """
+    cutoff = datetime.combine(date.today() - timedelta(days=retention_days), datetime.min.time())
+    archive_table = FoodLogArchive.__table__
+    moved = 0
+    last_id = 0
+    
+    while True:
+        logs = FoodLog.query.filter(FoodLog.logged_at < cutoff, FoodLog.id > last_id).order_by(
+            FoodLog.id).limit(batch_size).all()
+        if not logs:
+            break
+        last_id = logs[-1].id
+        
+        # Aggregate the batch per (user, day) before touching rollups
+        totals = {}
+        for log in logs:
+            key = (log.user_id, log.logged_at.date())
+            t = totals.setdefault(key, dict.fromkeys(SUMMARY_FIELDS, 0.0) | {'meal_count': 0})
+            for field in SUMMARY_FIELDS:
+                t[field] += getattr(log, field) or 0
+            t['meal_count'] += 1
+        
+        user_ids = {u for u, _ in totals}
+        days = {d for _, d in totals}
+        existing = {(r.user_id, r.day): r for r in DailyRollup.query.filter(
+            DailyRollup.user_id.in_(user_ids), DailyRollup.day.in_(days))}
+        for (user_id, day), t in totals.items():
+            rollup = existing.get((user_id, day))
+            if rollup is None:
+                db.session.add(DailyRollup(user_id=user_id, day=day, **t))
+            else:
+                for field, v in t.items():
+                    setattr(rollup, field, (getattr(rollup, field) or 0) + v)
+        
+        db.session.execute(archive_table.insert(), [{
+            'id': l.id, 'user_id': l.user_id, 'food_id': l.food_id, 'quantity': l.quantity,
+            'meal_type': l.meal_type, 'logged_at': l.logged_at, 'calories': l.calories,
+            'protein': l.protein, 'carbs': l.carbs, 'fat': l.fat
+        } for l in logs])
+        FoodLog.query.filter(FoodLog.id.in_([l.id for l in logs])).delete(synchronize_session=False)
+        db.session.commit()
+        
+        moved += len(logs)
+        if progress:
+            progress(moved)
+    
+    return moved
+
+def get_nutrient_report(user_id, target_date=None):
+    """Totals of every packed nutrient for a day's logs, in one query"""
+    if target_date is None: target_date = date.today()
+    start = datetime.combine(target_date, datetime.min.time())
+    end = datetime.combine(target_date, datetime.max.time())
+    
+    rows = db.session.query(FoodLog.quantity, Food.nutrients).join(Food, FoodLog.food_id == Food.id).filter(
+        FoodLog.user_id == user_id, FoodLog.logged_at.between(start, end), Food.nutrients.isnot(None)).all()
+    
+    if not rows:
+        return {field: 0 for field in NUTRIENT_FIELDS}
+    
+    # Stack the blobs into one (n_logs, n_nutrients) matrix and weight by quantity
+    width = len(NUTRIENT_FIELDS) * NUTRIENT_DTYPE.itemsize
+    matrix = np.frombuffer(b''.join(blob[:width].ljust(width, b'\0') for _, blob in rows),
+                           dtype=NUTRIENT_DTYPE).reshape(len(rows), len(NUTRIENT_FIELDS))
+    weights = np.array([q / 100 for q, _ in rows], dtype=np.float64)
+    totals = weights @ matrix
+    return {field: round(float(v), 2) for field, v in zip(NUTRIENT_FIELDS, totals)}
 
 def get_meal_breakdown(user_id, target_date=None):
     if target_date is None: target_date = date.today()
@@ -86,10 +305,15 @@ def get_meal_breakdown(user_id, target_date=None):
         FoodLog.user_id == user_id, FoodLog.logged_at.between(start, end)).group_by(FoodLog.meal_type).all()
     return {m.meal_type: round(m.calories or 0, 1) for m in meals}
 
+@replica_reads()
+@replica_reads()
 def get_weekly_data(user_id):
     today = date.today()
+    # The week's rollups in one query instead of one per day
+    rollups = {r.day: r for r in DailyRollup.query.filter(
+        DailyRollup.user_id == user_id, DailyRollup.day.between(today - timedelta(days=6), today))}
     return [{'date': (today - timedelta(days=i)).strftime('%a'), 
-             'calories': get_daily_summary(user_id, today - timedelta(days=i))['calories']} 
+             'calories': get_daily_summary(user_id, today - timedelta(days=i), rollups)['calories']} 
             for i in range(6, -1, -1)]
 
 def get_recent_foods(user_id, limit=5):
@@ -105,6 +329,24 @@ def get_streak_badge(streak):
 
 
 
+@replica_reads()
 def export_food_diary_csv(user_id, days=30):
-    logs = FoodLog.query.filter(FoodLog.user_id == user_id).all()
-    return pd.DataFrame([{'Date': l.logged_at, 'Food': l.food.name, 'Calories': l.calories} for l in logs])
\ No newline at end of file
+    """Food diary for the last `days` days, merging archived and live logs"""
+    since = datetime.combine(date.today() - timedelta(days=days), datetime.min.time())
+    
+    sources = [FoodLog]
+    watermark = archive_watermark(user_id)
+    if watermark is not None and since.date() <= watermark:
+        sources.append(FoodLogArchive)
+    
+    rows = []
+    for source in sources:
+        rows.extend(db.session.query(
+            source.logged_at, source.meal_type, Food.name, source.quantity,
+            source.calories, source.protein, source.carbs, source.fat
+        ).join(Food, source.food_id == Food.id).filter(
+            source.user_id == user_id, source.logged_at >= since).all())
+    
+    rows.sort(key=lambda r: r[0])
+    return pd.DataFrame(rows, columns=['Date', 'Meal', 'Food', 'Quantity (g)',
+                                       'Calories', 'Protein', 'Carbs', 'Fat'])
@@ -0,0 +1,133 @@
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from model import db, WeightLog
+from user_cache import MISSING, UserCache
+
+# Extra history loaded before a range so the smoothed trend is warmed up
+TREND_WARMUP_DAYS = 60
+
+# Latest weigh-in per user, until their next weigh-in
+_latest_cache = UserCache('_weight_changed')
+
+
+def smooth_weights(days, weights, alpha=0.1):
+    """Exponentially smoothed trend that accounts for gaps between weigh-ins.
+
+    `alpha` is the per-day smoothing factor; a weigh-in `dt` days after the
+    previous one gets weight 1 - (1 - alpha) ** dt, so skipping a week moves
+    the trend as much as seven daily entries would.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    trend = np.empty_like(weights)
+    if len(weights) == 0:
+        return trend
+    gaps = np.diff(np.asarray(days, dtype=np.float64), prepend=days[0])
+    factors = 1.0 - (1.0 - alpha) ** np.maximum(gaps, 0.0)
+    trend[0] = weights[0]
+    for i in range(1, len(weights)):
+        trend[i] = trend[i - 1] + factors[i] * (weights[i] - trend[i - 1])
+    return trend
+
+
+def lttb_indices(x, y, threshold):
+    """Indices kept by Largest-Triangle-Three-Buckets downsampling.
+
+    Always keeps the first and last point; each bucket in between keeps the
+    point forming the largest triangle with the previously kept point and
+    the average of the next bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+
+    a = 0
+    for b in range(threshold - 2):
+        lo, hi = edges[b], edges[b + 1]
+        nlo, nhi = edges[b + 1], (edges[b + 2] if b + 2 < len(edges) else n)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[b + 1] = a
+    return kept
+
+
+def get_weight_trend(user_id, days=365, max_points=300, alpha=0.1):
+    """Raw and smoothed weights over the last `days`, downsampled to `max_points`"""
+    end = datetime.now()
+    start = end - timedelta(days=days)
+    rows = db.session.query(WeightLog.logged_at, WeightLog.weight).filter(
+        WeightLog.user_id == user_id,
+        WeightLog.logged_at >= start - timedelta(days=TREND_WARMUP_DAYS),
+        WeightLog.logged_at <= end
+    ).order_by(WeightLog.logged_at).all()
+
+    if not rows:
+        return {'points': [], 'count': 0}
+
+    timestamps = np.array([r[0].timestamp() for r in rows]) / 86400.0
+    weights = np.array([r[1] for r in rows], dtype=np.float64)
+    trend = smooth_weights(timestamps, weights, alpha)
+
+    in_range = np.flatnonzero(timestamps >= start.timestamp() / 86400.0)
+    kept = in_range[lttb_indices(timestamps[in_range], weights[in_range], max_points)]
+
+    return {
+        'points': [{
+            'date': rows[i][0].isoformat(),
+            'weight': round(float(weights[i]), 2),
+            'trend': round(float(trend[i]), 2)
+        } for i in kept],
+        'count': int(len(in_range))
+    }
+
+
+def get_latest_weight(user_id, alpha=0.1):
+    """Latest weigh-in and its smoothed trend, cached per user until the next log"""
+    latest = _latest_cache.get(user_id)
+    if latest is not MISSING:
+        return latest
+
+    started = time.time()
+    rows = db.session.query(WeightLog.logged_at, WeightLog.weight).filter(
+        WeightLog.user_id == user_id,
+        WeightLog.logged_at >= datetime.now() - timedelta(days=TREND_WARMUP_DAYS)
+    ).order_by(WeightLog.logged_at).all()
+    if not rows:
+        last = WeightLog.query.filter_by(user_id=user_id).order_by(WeightLog.logged_at.desc()).first()
+        rows = [(last.logged_at, last.weight)] if last else []
+
+    latest = None
+    if rows:
+        timestamps = np.array([r[0].timestamp() for r in rows]) / 86400.0
+        trend = smooth_weights(timestamps, [r[1] for r in rows], alpha)
+        latest = {
+            'date': rows[-1][0].isoformat(),
+            'weight': rows[-1][1],
+            'trend': round(float(trend[-1]), 2)
+        }
+
+    _latest_cache.put(user_id, latest, since=started)
+    return latest
+
+
+def log_weight(user, weight, notes=None, logged_at=None):
+    """Record a weigh-in, keep the profile weight current and refresh the cache"""
+    entry = WeightLog(user_id=user.id, weight=weight, notes=notes, logged_at=logged_at or datetime.now())
+    db.session.add(entry)
+
+    # Profile weight (used by get_bmi and calculate_targets) follows the newest weigh-in
+    newest = WeightLog.query.filter_by(user_id=user.id).order_by(WeightLog.logged_at.desc()).first()
+    if newest is None or entry.logged_at >= newest.logged_at:
+        user.weight = weight
+        user.calculate_targets()
+
+    db.session.commit()
+    _latest_cache.changed(user.id)
+    return entry